@@ -0,0 +1,448 @@
+# benchmark.py
+# 效能測試 (不需要網路或 Chrome)
+#   python benchmark.py suite --gems 5000 --output result.json
+#   python benchmark.py ingest --count 100000
+#   python benchmark.py weighted --items 5000 --draws 100000
+#   python benchmark.py snapshot --gems 700 --supports 300
+#   python benchmark.py e2e --gems 700 --latency 0.1    (本機 poedb 替身伺服器 + 完整 init_data 流程)
+import argparse
+import bisect
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+try:
+    import resource  # 只有 Unix 有
+except ImportError:
+    resource = None
+
+from database import PoeDatabase, gem_content_hash, split_tags
+import metrics
+from sampler import WeightedPool
+
+def synthetic_gems(count, tags_per_gem=4, tag_pool=40, seed=0):
+    """產生假的寶石資料 (generator)"""
+    rng = random.Random(seed)
+    pool = [f"Tag {i}" for i in range(tag_pool)]
+    per_gem = min(tags_per_gem, tag_pool)
+    for i in range(count):
+        yield {
+            "name": f"Gem {i}",
+            "tags": ", ".join(rng.sample(pool, per_gem)),
+            "link": f"https://poedb.tw/us/Gem_{i}",
+        }
+
+def synthetic_supports(count, tags_per_gem=2, tag_pool=40, seed=0):
+    """產生假的輔助寶石 (第一個標籤固定是 Support)"""
+    rng = random.Random(seed + 1)
+    pool = [f"Tag {i}" for i in range(tag_pool)]
+    per_gem = min(tags_per_gem, tag_pool)
+    for i in range(count):
+        yield {
+            "name": f"Support {i}",
+            "tags": ", ".join(["Support"] + rng.sample(pool, per_gem)),
+            "link": f"https://poedb.tw/us/Support_{i}",
+        }
+
+def synthetic_ascendancies(count=19):
+    """產生假的昇華職業名稱"""
+    return [f"Ascendancy {i}" for i in range(count)]
+
+def populate_database(db, gems=1000, tags_per_gem=4, tag_pool=40, ascendancies=19, seed=0, supports=0):
+    """把假資料寫進 PoeDatabase (走 bulk 寫入，輔助寶石走 sync_data)"""
+    db.bulk_save_ascendancies(synthetic_ascendancies(ascendancies))
+    db.bulk_save_gems(synthetic_gems(gems, tags_per_gem, tag_pool, seed))
+    if supports:
+        db.sync_data(None, None, support_list=list(synthetic_supports(supports, tag_pool=tag_pool, seed=seed)))
+    return db
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+def row_by_row_save_gems(db, gems_list):
+    """
+    bulk_save_gems 之前的寫法 (比較基準)：逐筆 INSERT OR REPLACE 並逐筆重建標籤對應，
+    最後清掉 id 被換掉的寶石留下的對應，整批一個 commit
+    """
+    for gem in gems_list:
+        db.cursor.execute('''
+            INSERT OR REPLACE INTO skill_gems (name, tags, link, content_hash)
+            VALUES (?, ?, ?, ?)
+        ''', (gem['name'], gem['tags'], gem['link'], gem_content_hash(gem)))
+        db._index_gem_tags(db.cursor.lastrowid, gem['tags'])
+    db.cursor.execute('DELETE FROM gem_tags WHERE gem_id NOT IN (SELECT id FROM skill_gems)')
+    db.conn.commit()
+
+def bench_ingest(count=100000, tags_per_gem=4, tag_pool=40):
+    """比較逐筆寫入 (row_by_row_save_gems、預設設定) 與 bulk_save_gems (批次寫入、tuned)"""
+    results = {"count": count}
+    gems = list(synthetic_gems(count, tags_per_gem, tag_pool))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PoeDatabase(os.path.join(tmp, "before.db"))
+        seconds = _timed(row_by_row_save_gems, db, gems)
+        db.close()
+        results["row_by_row"] = {"seconds": round(seconds, 3), "rows_per_sec": round(count / seconds)}
+
+        db = PoeDatabase(os.path.join(tmp, "after.db"), tuned=True)
+        seconds = _timed(db.bulk_save_gems, gems)
+        db.close()
+        results["bulk_save_gems"] = {"seconds": round(seconds, 3), "rows_per_sec": round(count / seconds)}
+
+    results["speedup"] = round(results["row_by_row"]["seconds"] / results["bulk_save_gems"]["seconds"], 2)
+    return results
+
+def bench_weighted(items=5000, draws=100000, updates=10, seed=0):
+    """
+    加權抽樣：alias table (WeightedPool) 對比累積和。
+    naive_choices 是每次呼叫 random.choices(weights=...) (每抽一次就重算一次累積和)，
+    cumsum_bisect 是先算好累積和再二分搜尋，alias 是 O(1) 查表。
+    另外比較改 updates 個權重時，增量更新與整張重建的時間。
+    """
+    rng = random.Random(seed)
+    weights = [rng.uniform(0.1, 10.0) for _ in range(items)]
+    population = range(items)
+    results = {"items": items, "draws": draws, "updates": updates}
+
+    # naive 太慢，只抽 1/100 再換算
+    naive_draws = max(1, draws // 100)
+    seconds = _timed(lambda: [rng.choices(population, weights)[0] for _ in range(naive_draws)])
+    results["naive_choices"] = {"us_per_draw": round(seconds / naive_draws * 1e6, 3)}
+
+    cum = list(itertools.accumulate(weights))
+    total = cum[-1]
+    seconds = _timed(lambda: [bisect.bisect_right(cum, rng.random() * total) for _ in range(draws)])
+    results["cumsum_bisect"] = {"us_per_draw": round(seconds / draws * 1e6, 3)}
+
+    build = _timed(WeightedPool, weights)
+    table = WeightedPool(weights)
+    seconds = _timed(lambda: [table.draw(rng) for _ in range(draws)])
+    results["alias"] = {"us_per_draw": round(seconds / draws * 1e6, 3), "build_ms": round(build * 1000, 3)}
+
+    changes = {rng.randrange(items): rng.uniform(0.1, 10.0) for _ in range(updates)}
+    results["alias"]["update_ms"] = round(_timed(table.update, changes) * 1000, 3)
+
+    results["speedup_vs_naive"] = round(results["naive_choices"]["us_per_draw"] / results["alias"]["us_per_draw"], 1)
+    results["speedup_vs_bisect"] = round(results["cumsum_bisect"]["us_per_draw"] / results["alias"]["us_per_draw"], 2)
+    return results
+
+def bench_builds(gems=700, supports=300, count=100000, tags_per_gem=4, tag_pool=40, seed=0):
+    """
+    完整流派產生速度：相容表建表時間 + 每秒產生幾組 (昇華 + 主技能 + 5 輔助)，
+    另外跟「每組都用標籤字串比對找相容輔助」的做法比較。
+    """
+    from builds import generate_builds
+    results = {"gems": gems, "supports": supports, "count": count}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PoeDatabase(os.path.join(tmp, "builds.db"))
+        populate_database(db, gems, tags_per_gem, tag_pool, seed=seed, supports=supports)
+
+        results["index_build_ms"] = round(_timed(db.get_build_index) * 1000, 3)
+        seconds = _timed(lambda: sum(1 for _ in generate_builds(db, count, seed=seed)))
+        results["bitset"] = {"seconds": round(seconds, 4), "builds_per_sec": round(count / seconds)}
+
+        # 對照組：每組重新用字串比對篩出相容輔助
+        actives = db.get_gems_by_ids(db.get_gem_pool())
+        support_list = db.get_support_gems()
+        rng = random.Random(seed)
+        naive_count = max(1, count // 100)
+
+        def naive():
+            for _ in range(naive_count):
+                skill = rng.choice(actives)
+                skill_tags = [t.strip() for t in skill["tags"].split(",")]
+                pool = [s for s in support_list
+                        if any(t.strip() in skill_tags for t in s["tags"].split(",") if t.strip() != "Support")]
+                rng.sample(pool, min(5, len(pool)))
+        seconds = _timed(naive)
+        results["string_match"] = {"builds_per_sec": round(naive_count / seconds)}
+        results["speedup"] = round(results["bitset"]["builds_per_sec"] / results["string_match"]["builds_per_sec"], 1)
+        db.close()
+    return results
+
+def bench_snapshot(gems=700, supports=300, ascendancies=19, tags_per_gem=4, tag_pool=40, repeat=5, seed=0):
+    """
+    資料快照：匯出 / 匯入時間、檔案大小，以及新安裝 (空資料庫 + 快照) 到第一次抽籤的時間
+    """
+    from snapshot import export_snapshot, import_snapshot, seed_database
+    results = {"gems": gems, "supports": supports, "ascendancies": ascendancies}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "source.db")
+        db = populate_database(PoeDatabase(db_path), gems, tags_per_gem, tag_pool, ascendancies, seed, supports)
+        path = os.path.join(tmp, "snapshot.json.gz")
+        start = time.perf_counter()
+        summary = export_snapshot(db, path, "us")
+        results["export_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        results["snapshot_bytes"] = summary["bytes"]
+        db.close()
+        results["db_bytes"] = os.path.getsize(db_path)
+
+        target = PoeDatabase(os.path.join(tmp, "import.db"))
+        results["import"] = _repeat(lambda: import_snapshot(target, path), repeat)
+        target.close()
+
+        # 冷啟動：開一個全新的資料庫檔、匯入快照、抽一次
+        def first_roll():
+            name = os.path.join(tmp, f"fresh_{time.perf_counter_ns()}.db")
+            fresh = PoeDatabase(name)
+            # seed_database 會印 [snapshot] 訊息，不能混進 stdout 的 JSON 結果
+            with contextlib.redirect_stdout(io.StringIO()):
+                seeded = seed_database(fresh, "us", path)
+            if not seeded:
+                raise RuntimeError(f"snapshot {path} was not imported")
+            fresh.get_random_ascendancies(1)
+            fresh.get_random_gems(count=1)
+            fresh.close()
+        results["time_to_first_roll"] = _repeat(first_roll, repeat)
+    return results
+
+def _max_rss_mb():
+    """整個程序到目前為止的最大常駐記憶體 (MB)，不支援的平台回傳 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位是 KiB，macOS 是 bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def bench_e2e(gems=700, supports=300, ascendancies=19, latency=0.0, workers=4, langs=("tw", "us"), seed=0):
+    """
+    端到端爬取：對本機的 poedb 替身伺服器 (poedb_stub.py) 跑完整的 init_data.main
+    (抓頁面、解析、分批暫存、差異同步)，回報 pages/s、rows/s 與尖峰記憶體。
+    rows/s 以這次真的解析的列數 (metrics 的 scraper.*.rows) 計算，頁面沒變而略過解析時為 0。
+    - cold：全新的資料庫、不用快取
+    - memory：同樣的流程開 tracemalloc 再跑一次 (Python 配置的尖峰；會變慢，所以跟計時分開)
+    - cached：帶 HttpCache 跑兩次，第二次是 304 + 頁面沒變略過解析的情況
+    """
+    import init_data
+    import scraper
+    from http_cache import HttpCache
+    from poedb_stub import PoedbStub
+
+    langs = list(langs)
+    pages = len(langs) * len(scraper.PAGES)
+    rows = len(langs) * (gems + supports + ascendancies)
+    results = {"gems": gems, "supports": supports, "ascendancies": ascendancies, "latency": latency,
+               "workers": workers, "langs": langs, "pages": pages, "rows": rows}
+    cwd = os.getcwd()
+
+    def run(workdir, cache=None):
+        # 資料庫檔建在 workdir；init_data 印很多東西，全部丟掉
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+        was_enabled = metrics.enabled()
+        metrics.enable()
+        metrics.reset()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                init_data.main("http", langs, workers, cache=cache)
+                seconds = time.perf_counter() - start
+            counters = metrics.snapshot()["counters"]
+            parsed = sum(counters.get(f"scraper.{source}.rows", 0) for source in ("http", "selenium"))
+            stored = 0
+            for lang_code in langs:
+                db = PoeDatabase(init_data.locale_db_name(lang_code))
+                stored += sum(db.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                              for table in ("ascendancies", "skill_gems", "support_gems"))
+                db.close()
+        finally:
+            os.chdir(cwd)
+            metrics.reset()
+            if not was_enabled:
+                metrics.disable()
+        return {"seconds": round(seconds, 4), "pages_per_sec": round(pages / seconds, 2),
+                "rows_parsed": parsed, "rows_per_sec": round(parsed / seconds), "rows_stored": stored}
+
+    with tempfile.TemporaryDirectory() as tmp, PoedbStub(gems, supports, ascendancies, latency, seed=seed) as stub:
+        scraper.set_base_url(stub.base_url)
+        try:
+            results["cold"] = run(os.path.join(tmp, "cold"))
+
+            tracemalloc.start()
+            try:
+                results["memory"] = run(os.path.join(tmp, "memory"))
+                results["memory"]["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            finally:
+                tracemalloc.stop()
+
+            cache = HttpCache(os.path.join(tmp, "http_cache"))
+            results["cached"] = {
+                "first": run(os.path.join(tmp, "cached"), cache),
+                "second": run(os.path.join(tmp, "cached"), cache),
+            }
+            results["requests"] = stub.requests
+        finally:
+            scraper.set_base_url(None)
+    results["max_rss_mb"] = _max_rss_mb()
+    return results
+
+def _repeat(func, repeat):
+    """執行 repeat 次，回傳 {first_ms, mean_ms, min_ms}"""
+    times = [_timed(func) * 1000 for _ in range(repeat)]
+    return {
+        "first_ms": round(times[0], 4),
+        "mean_ms": round(sum(times) / len(times), 4),
+        "min_ms": round(min(times), 4),
+    }
+
+# 篩選測試裡「包含」規則的上限 (每多一條包含，符合的寶石大約只剩 tags_per_gem / tag_pool)
+MAX_INCLUDE_RULES = 2
+
+def _filter_rules(rule_count, tag_pool, rng, gem_list):
+    """
+    產生 rule_count 條規則，回傳 (include, exclude)。
+    包含的標籤取自隨機挑的一個寶石 (一定同時出現，最多 MAX_INCLUDE_RULES 條，再多池子就只剩個位數)，
+    其餘都是不在那個寶石上的排除標籤，所以候選池至少有那個寶石，量到的不會是空池子。
+    """
+    if not gem_list:
+        return [], []
+    gem_tags = split_tags(rng.choice(gem_list)["tags"])
+    include = rng.sample(gem_tags, min(rule_count // 2, MAX_INCLUDE_RULES, len(gem_tags)))
+    others = [f"Tag {i}" for i in range(tag_pool) if f"Tag {i}" not in gem_tags]
+    exclude = rng.sample(others, min(rule_count - len(include), len(others)))
+    return include, exclude
+
+def run_suite(gems=5000, tags_per_gem=4, tag_pool=40, ascendancies=19,
+              max_rules=10, roll_count=5, repeat=200, seed=0):
+    """
+    跑完整的效能測試，回傳可直接 json.dump 的結果
+    """
+    rng = random.Random(seed)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "params": {
+            "gems": gems, "tags_per_gem": tags_per_gem, "tag_pool": tag_pool,
+            "ascendancies": ascendancies, "max_rules": max_rules,
+            "roll_count": roll_count, "repeat": repeat, "seed": seed,
+        },
+        "results": {},
+    }
+    out = results["results"]
+    gem_list = list(synthetic_gems(gems, tags_per_gem, tag_pool, seed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PoeDatabase(os.path.join(tmp, "save.db"))
+        seconds = _timed(row_by_row_save_gems, db, gem_list)
+        out["row_by_row"] = {"seconds": round(seconds, 4), "rows_per_sec": round(gems / seconds)}
+        db.close()
+
+        db = PoeDatabase(os.path.join(tmp, "bulk.db"))
+        seconds = _timed(db.bulk_save_gems, gem_list)
+        out["bulk_save_gems"] = {"seconds": round(seconds, 4), "rows_per_sec": round(gems / seconds)}
+        db.bulk_save_ascendancies(synthetic_ascendancies(ascendancies))
+
+        out["get_all_tags"] = _repeat(db.get_all_tags, max(1, repeat // 10))
+        out["get_random_ascendancies"] = _repeat(lambda: db.get_random_ascendancies(roll_count), repeat)
+
+        out["get_random_gems"] = {}
+        for rule_count in range(max_rules + 1):
+            include, exclude = _filter_rules(rule_count, tag_pool, rng, gem_list)
+            matched = len(db.get_gem_pool(include, exclude))
+            if not matched:
+                print(f"WARNING: {rule_count} rules matched no gems, timings measure an empty pool",
+                      file=sys.stderr)
+            # 清掉候選池快取，first_ms 才是冷啟動的時間
+            db._pools.clear()
+            stats = _repeat(lambda: db.get_random_gems(include, exclude, roll_count), repeat)
+            stats["matched"] = matched
+            out["get_random_gems"][str(rule_count)] = stats
+
+        # 輸入即搜尋：模擬一個字一個字打出寶石名稱
+        out["search_gems"] = {}
+        name = gem_list[len(gem_list) // 2]["name"] if gem_list else "Gem"
+        for n in range(1, len(name) + 1):
+            prefix = name[:n]
+            stats = _repeat(lambda: db.search_gems(prefix), max(1, repeat // 10))
+            stats["matched"] = len(db.search_gems(prefix))
+            out["search_gems"][prefix] = stats
+        db.close()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="POE Build Picker 效能測試")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_suite = sub.add_parser("suite", help="完整測試 (寫入、標籤、抽籤)")
+    p_suite.add_argument("--gems", type=int, default=5000)
+    p_suite.add_argument("--tags-per-gem", type=int, default=4)
+    p_suite.add_argument("--tag-pool", type=int, default=40)
+    p_suite.add_argument("--ascendancies", type=int, default=19)
+    p_suite.add_argument("--max-rules", type=int, default=10)
+    p_suite.add_argument("--roll-count", type=int, default=5)
+    p_suite.add_argument("--repeat", type=int, default=200)
+    p_suite.add_argument("--seed", type=int, default=0)
+
+    p_ingest = sub.add_parser("ingest", help="寶石寫入速度 (before / after)")
+    p_ingest.add_argument("--count", type=int, default=100000)
+    p_ingest.add_argument("--tags-per-gem", type=int, default=4)
+    p_ingest.add_argument("--tag-pool", type=int, default=40)
+
+    p_builds = sub.add_parser("builds", help="完整流派產生速度 (標籤 bitset)")
+    p_builds.add_argument("--gems", type=int, default=700)
+    p_builds.add_argument("--supports", type=int, default=300)
+    p_builds.add_argument("--count", type=int, default=100000)
+    p_builds.add_argument("--seed", type=int, default=0)
+
+    p_weighted = sub.add_parser("weighted", help="加權抽樣 (alias table 對比累積和)")
+    p_weighted.add_argument("--items", type=int, default=5000)
+    p_weighted.add_argument("--draws", type=int, default=100000)
+    p_weighted.add_argument("--updates", type=int, default=10, help="增量更新時改幾個權重")
+    p_weighted.add_argument("--seed", type=int, default=0)
+
+    p_snapshot = sub.add_parser("snapshot", help="資料快照匯出 / 匯入與新安裝到第一次抽籤的時間")
+    p_snapshot.add_argument("--gems", type=int, default=700)
+    p_snapshot.add_argument("--supports", type=int, default=300)
+    p_snapshot.add_argument("--repeat", type=int, default=5)
+    p_snapshot.add_argument("--seed", type=int, default=0)
+
+    p_e2e = sub.add_parser("e2e", help="對本機 poedb 替身伺服器跑完整更新流程 (pages/s、rows/s、尖峰記憶體)")
+    p_e2e.add_argument("--gems", type=int, default=700)
+    p_e2e.add_argument("--supports", type=int, default=300)
+    p_e2e.add_argument("--ascendancies", type=int, default=19)
+    p_e2e.add_argument("--latency", type=float, default=0.0, help="替身伺服器每個請求延遲幾秒")
+    p_e2e.add_argument("--workers", type=int, default=4)
+    p_e2e.add_argument("--lang", nargs="+", default=["tw", "us"], dest="langs")
+    p_e2e.add_argument("--seed", type=int, default=0)
+
+    for p in (p_suite, p_ingest, p_weighted, p_builds, p_snapshot, p_e2e):
+        p.add_argument("--output", help="另存 JSON 結果到檔案 (方便前後比較)")
+
+    args = parser.parse_args()
+    if args.command == "suite":
+        results = run_suite(args.gems, args.tags_per_gem, args.tag_pool, args.ascendancies,
+                            args.max_rules, args.roll_count, args.repeat, args.seed)
+    elif args.command == "ingest":
+        results = bench_ingest(args.count, args.tags_per_gem, args.tag_pool)
+    elif args.command == "builds":
+        results = bench_builds(args.gems, args.supports, args.count, seed=args.seed)
+    elif args.command == "weighted":
+        results = bench_weighted(args.items, args.draws, args.updates, args.seed)
+    elif args.command == "snapshot":
+        results = bench_snapshot(args.gems, args.supports, repeat=args.repeat, seed=args.seed)
+    elif args.command == "e2e":
+        results = bench_e2e(args.gems, args.supports, args.ascendancies, args.latency, args.workers,
+                            args.langs, args.seed)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# builds.py
+# 完整流派產生器：昇華 + 主技能 + N 個相容的輔助寶石
+# 相容性用標籤 bitset 判斷 (每個標籤一個 bit，共用標籤 = bitwise AND 不為 0)，不做字串比對
+from database import split_tags
+from sampler import Sampler
+
+# 預設每個主技能搭配幾個輔助寶石 (6 連線 = 1 主技能 + 5 輔助)
+SUPPORT_COUNT = 5
+# 輔助寶石本身都有的標籤，不能拿來判斷相容
+SUPPORT_TAGS = ("Support", "輔助")
+
+class BuildIndex:
+    """
+    預先算好的相容表 (每個資料版本建一次，見 PoeDatabase.get_build_index)：
+    - tag_bits：{標籤: bit}，主動技能的標籤排在前面，只出現在輔助寶石上的標籤接在後面
+      (後者不影響相容判斷，但排除規則要認得它們)
+    - active_bits / support_bits：每個寶石的標籤 bitset
+    - compatible[i]：主動技能 i 可用的輔助寶石索引 (active_bits[i] & support_bits[j] != 0)
+    沒有任何跟主動技能共用的標籤的輔助寶石 (通用輔助) 視為跟所有技能相容。
+    """
+    def __init__(self, actives, supports):
+        self.actives = actives
+        self.supports = supports
+        self.tag_bits = {}
+        self.active_bits = [self._bits(split_tags(gem["tags"]), add=True) for gem in actives]
+        # 主動技能標籤的 bit 範圍 (相容判斷只看這些 bit)
+        self.all_bits = (1 << len(self.tag_bits)) - 1
+        # 篩選用的原始 bitset (含只有輔助寶石才有的標籤) 與相容判斷用的 bitset (通用輔助是全 1)
+        self.support_tag_bits = [self._bits(split_tags(gem["tags"]), add=True) for gem in supports]
+        self.support_bits = [(bits & self.all_bits) or self.all_bits for bits in self.support_tag_bits]
+        self.active_index = {gem["name"]: i for i, gem in enumerate(actives)}
+        self.compatible = [
+            [j for j, sb in enumerate(self.support_bits) if ab & sb]
+            for ab in self.active_bits
+        ]
+
+    def _bits(self, tags, add=False):
+        bits = 0
+        for tag in tags:
+            if tag in SUPPORT_TAGS:
+                continue
+            if tag not in self.tag_bits:
+                if not add:
+                    continue
+                self.tag_bits[tag] = 1 << len(self.tag_bits)
+            bits |= self.tag_bits[tag]
+        return bits
+
+    def mask(self, tags):
+        """標籤 list 轉成 bitset (不認得的標籤忽略)"""
+        return self._bits(tags or ())
+
+    def is_compatible(self, active, support):
+        """兩個索引是否相容 (一次 AND)"""
+        return bool(self.active_bits[active] & self.support_bits[support])
+
+    def candidates(self, active_names, exclude_tags=None, min_supports=SUPPORT_COUNT):
+        """
+        依篩選後的主技能名稱，回傳 [(主技能索引, 可用輔助索引 list)]。
+        exclude_tags 也套用在輔助寶石 (support 的標籤 & 排除 mask 必須為 0)；
+        相容輔助不足 min_supports 個的主技能直接排除。
+        """
+        exclude_mask = self.mask(exclude_tags)
+        result = []
+        for name in active_names:
+            i = self.active_index.get(name)
+            if i is None:
+                continue
+            supports = self.compatible[i]
+            if exclude_mask:
+                supports = [j for j in supports if not self.support_tag_bits[j] & exclude_mask]
+            if len(supports) >= min_supports:
+                result.append((i, supports))
+        return result
+
+def generate_builds(db, count, include_tags=None, exclude_tags=None, support_count=SUPPORT_COUNT, seed=None):
+    """
+    產生 count 組完整流派的 generator：{"roll", "ascendancy", "skill", "supports"}。
+    主技能要符合 include / exclude；輔助寶石跟主技能相容且不含排除標籤。
+    候選表只在開始時算一次，之後每組都是 O(support_count) 的記憶體抽樣。
+    """
+    sampler = Sampler(seed)
+    index = db.get_build_index()
+    asc_pool = db.get_ascendancy_pool()
+    active_names = [gem["name"] for gem in db.get_gems_by_ids(db.get_gem_pool(include_tags, exclude_tags))]
+    candidates = index.candidates(active_names, exclude_tags, support_count)
+    if not candidates:
+        return
+
+    rng = sampler.rng
+    for n in range(count):
+        active, supports = candidates[rng.randrange(len(candidates))]
+        picked = sampler.sample(supports, support_count)
+        yield {
+            "roll": n + 1,
+            "ascendancy": asc_pool[rng.randrange(len(asc_pool))] if asc_pool else None,
+            "skill": index.actives[active],
+            "supports": [index.supports[j] for j in picked],
+        }
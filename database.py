@@ -1,13 +1,102 @@
 import sqlite3
 import random
+import hashlib
+import csv
+import json
+import os
+import re
+
+from sampler import Sampler, WeightedPool
+from snapshot import seed_database
+import metrics
+
+def split_tags(tags_text):
+    """把 'Attack, AoE, Melee' 這種字串拆成不重複的標籤 list"""
+    if not tags_text:
+        return []
+    tags = []
+    for t in tags_text.split(','):
+        t = t.strip()
+        if t and t not in tags:
+            tags.append(t)
+    return tags
+
+def gem_content_hash(gem):
+    """寶石內容 (tags / link) 的雜湊，用來判斷同名寶石是否需要更新"""
+    raw = f"{gem.get('tags') or ''}\x1f{gem.get('link') or ''}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+# 每個語言各自一個資料庫檔案 (poe_builds_tw.db / poe_builds_us.db)
+DB_NAME_TEMPLATE = "poe_builds_{lang}.db"
+# 舊版只有一個 poe_builds.db，內容是最後一次爬取的語言
+LEGACY_DB_NAME = "poe_builds.db"
+
+def locale_db_name(lang_code):
+    """語言代碼對應的資料庫檔名"""
+    return DB_NAME_TEMPLATE.format(lang=lang_code)
+
+def detect_db_lang(db_name):
+    """從寶石連結 (https://poedb.tw/us/...) 判斷資料庫是哪個語言，判斷不出來回傳 None"""
+    conn = sqlite3.connect(db_name)
+    try:
+        row = conn.execute("SELECT link FROM skill_gems WHERE link IS NOT NULL LIMIT 1").fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    match = re.search(r"poedb\.tw/(\w+)/", row[0]) if row else None
+    return match.group(1) if match else None
+
+def migrate_legacy_db(lang_code):
+    """
+    舊版 poe_builds.db 屬於這個語言、而新檔案還不存在時，複製一份過去 (舊檔保留不動)
+    """
+    new_name = locale_db_name(lang_code)
+    if os.path.exists(new_name) or not os.path.exists(LEGACY_DB_NAME):
+        return False
+    if detect_db_lang(LEGACY_DB_NAME) != lang_code:
+        return False
+    src = sqlite3.connect(LEGACY_DB_NAME)
+    dst = sqlite3.connect(new_name)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    return True
 
 class PoeDatabase:
-    def __init__(self, db_name="poe_builds.db"):
+    def __init__(self, db_name="poe_builds.db", tuned=False):
         self.db_name = db_name
         self.conn = sqlite3.connect(self.db_name)
         self.cursor = self.conn.cursor()
+        # INSERT OR REPLACE 換掉舊資料時也要觸發 DELETE trigger (搜尋索引靠 trigger 同步)
+        self.cursor.execute("PRAGMA recursive_triggers = ON")
+        # 有沒有 FTS5 trigram 搜尋索引 (SQLite 3.34 以上)，見 _create_search_index
+        self.has_fts = False
+        # 抽籤用的候選池快取：{key: (data_version, list)}
+        self._pools = {}
+        self._sampler = Sampler()
+        # 加權抽籤用：名稱 -> 權重 (沒設定就是 1.0)、標籤 -> 倍率
+        self.weights = {}
+        self.tag_weights = {}
+        if tuned:
+            self.tune()
         self.create_tables()
 
+    def tune(self, journal_mode="WAL", synchronous="NORMAL", cache_mb=64):
+        """
+        選用的 SQLite 效能設定 (大量寫入時建議開啟)
+        WAL：讀寫互不阻擋；synchronous=NORMAL：WAL 下仍安全但少很多 fsync；cache_mb：page cache 大小
+        """
+        if journal_mode:
+            self.cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        if synchronous:
+            self.cursor.execute(f"PRAGMA synchronous={synchronous}")
+        if cache_mb:
+            # 負數代表以 KiB 為單位
+            self.cursor.execute(f"PRAGMA cache_size={-int(cache_mb) * 1024}")
+
     def create_tables(self):
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS ascendancies (
@@ -23,84 +112,788 @@ class PoeDatabase:
                 link TEXT
             )
         ''')
+        # 正規化標籤：tags 是標籤字典，gem_tags 是寶石與標籤的對應表
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS gem_tags (
+                tag_id INTEGER NOT NULL,
+                gem_id INTEGER NOT NULL,
+                PRIMARY KEY (tag_id, gem_id)
+            ) WITHOUT ROWID
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_gem_tags_gem ON gem_tags (gem_id)')
+        # 資料版本號：每次寫入 +1，快取用它判斷是否過期 (跨連線、跨重啟都有效)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        ''')
+        self.cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+        # 寶石詳細資料 (由 enricher.py 從各寶石頁面補上)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS gem_details (
+                gem_id INTEGER PRIMARY KEY,
+                level INTEGER,
+                colour TEXT,
+                mana_cost INTEGER,
+                quality TEXT,
+                fetched_at TEXT
+            )
+        ''')
+        # 上次寫入資料庫時各頁面的內容雜湊 (頁面沒變就不用再解析、寫入)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS page_hashes (
+                page TEXT PRIMARY KEY,
+                body_hash TEXT
+            )
+        ''')
+        # 輔助寶石 (跟主動技能分開存，只用在完整流派產生器，見 builds.py)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS support_gems (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE,
+                tags TEXT,
+                link TEXT,
+                content_hash TEXT
+            )
+        ''')
+        # 串流寫入的暫存區：爬到的列分批寫進 ingest_rows，ingest_checkpoints 記錄每頁寫到第幾列，
+        # 更新中斷時下次從該列接著寫；整頁完成 (done) 後才在 sync_staged 一次同步到正式資料表
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_rows (
+                page TEXT NOT NULL,
+                name TEXT NOT NULL,
+                row_no INTEGER NOT NULL,
+                tags TEXT,
+                link TEXT,
+                PRIMARY KEY (page, name)
+            ) WITHOUT ROWID
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                page TEXT PRIMARY KEY,
+                body_hash TEXT,
+                next_row INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # 每個標籤對應的寶石數 (寫入時維護，開啟介面時不用重掃寶石表)
+        if self._ensure_column('tags', 'gem_count', 'INTEGER NOT NULL DEFAULT 0'):
+            self._refresh_tag_counts()
+        # 差異同步用的內容雜湊 (舊資料庫補欄位並回填)
+        if self._ensure_column('skill_gems', 'content_hash', 'TEXT'):
+            rows = self.cursor.execute('SELECT id, tags, link FROM skill_gems').fetchall()
+            self.cursor.executemany(
+                'UPDATE skill_gems SET content_hash = ? WHERE id = ?',
+                [(gem_content_hash({"tags": r[1], "link": r[2]}), r[0]) for r in rows])
+        self._create_search_index()
         self.conn.commit()
 
+        # 舊版資料庫只有 skill_gems.tags 字串，第一次開啟時補建對應表 (做過就記在 meta，之後不再判斷)
+        if not self.cursor.execute("SELECT 1 FROM meta WHERE key = 'tag_index_built'").fetchone():
+            self.cursor.execute('SELECT EXISTS (SELECT 1 FROM skill_gems), EXISTS (SELECT 1 FROM gem_tags)')
+            has_gems, has_index = self.cursor.fetchone()
+            if has_gems and not has_index:
+                self.rebuild_tag_index()
+            self.cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tag_index_built', 1)")
+            self.conn.commit()
+
+    def _create_search_index(self):
+        """
+        寶石名稱 / 標籤的 FTS5 全文索引 (external content，資料仍只存在 skill_gems)。
+        trigram tokenizer 以每 3 個字元切詞，中文沒有空白分詞也能做子字串比對。
+        由 trigger 跟 skill_gems 同步，所有寫入路徑 (save / bulk / sync / clear) 都不用另外處理。
+        SQLite 太舊 (沒有 FTS5 或 trigram) 時 has_fts 為 False，搜尋改用 LIKE。
+        """
+        exists = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'gem_search'").fetchone()
+        if not exists:
+            try:
+                self.cursor.execute('''
+                    CREATE VIRTUAL TABLE gem_search USING fts5 (
+                        name, tags, content = 'skill_gems', content_rowid = 'id', tokenize = 'trigram'
+                    )
+                ''')
+            except sqlite3.OperationalError as e:
+                print(f"FTS5 search unavailable, falling back to LIKE: {e}")
+                return
+            # 既有資料一次建好索引
+            self.cursor.execute("INSERT INTO gem_search (gem_search) VALUES ('rebuild')")
+        for sql in (
+            '''CREATE TRIGGER IF NOT EXISTS skill_gems_search_ai AFTER INSERT ON skill_gems BEGIN
+                   INSERT INTO gem_search (rowid, name, tags) VALUES (new.id, new.name, new.tags);
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS skill_gems_search_ad AFTER DELETE ON skill_gems BEGIN
+                   INSERT INTO gem_search (gem_search, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+               END''',
+            '''CREATE TRIGGER IF NOT EXISTS skill_gems_search_au AFTER UPDATE OF name, tags ON skill_gems BEGIN
+                   INSERT INTO gem_search (gem_search, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+                   INSERT INTO gem_search (rowid, name, tags) VALUES (new.id, new.name, new.tags);
+               END''',
+        ):
+            self.cursor.execute(sql)
+        self.has_fts = True
+
+    def _ensure_column(self, table, column, decl):
+        """欄位不存在就 ALTER TABLE 補上，回傳是否有新增"""
+        columns = [r[1] for r in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if column in columns:
+            return False
+        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+
+    def _bump_version(self):
+        """資料有變動時呼叫 (在寫入的交易內)：更新標籤統計並把版本號 +1"""
+        self._refresh_tag_counts()
+        self.cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+    def _refresh_tag_counts(self):
+        """重算 tags.gem_count (只讀 gem_tags 索引)，並移除已經沒有寶石的標籤"""
+        self.cursor.execute('''
+            UPDATE tags SET gem_count = (SELECT COUNT(*) FROM gem_tags WHERE gem_tags.tag_id = tags.id)
+        ''')
+        self.cursor.execute('DELETE FROM tags WHERE gem_count = 0')
+
+    def get_data_version(self):
+        """目前的資料版本號"""
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'data_version'")
+        return self.cursor.fetchone()[0]
+
+    @metrics.timed("db.save_ascendancies")
     def save_ascendancies(self, ascendancy_list):
         for name in ascendancy_list:
             self.cursor.execute('INSERT OR IGNORE INTO ascendancies (name) VALUES (?)', (name,))
+        self._bump_version()
         self.conn.commit()
 
+    @metrics.timed("db.save_gems")
     def save_gems(self, gems_list):
-        for gem in gems_list:
+        """寫入寶石 (同 bulk_save_gems：同名寶石就地更新，id 與詳細資料都保留)"""
+        return self.bulk_save_gems(gems_list)
+
+    @metrics.timed("db.bulk_save_ascendancies")
+    def bulk_save_ascendancies(self, ascendancy_list):
+        """大量寫入昇華職業 (executemany + 單一交易)"""
+        with self.conn:
+            self.cursor.executemany('INSERT OR IGNORE INTO ascendancies (name) VALUES (?)',
+                                    ((name,) for name in ascendancy_list))
+            self._bump_version()
+
+    @metrics.timed("db.bulk_save_gems")
+    def bulk_save_gems(self, gems):
+        """
+        大量寫入寶石：executemany + 單一交易，同名寶石用 ON CONFLICT DO UPDATE 更新 (id 不會變)。
+        gems 可以是 list 或 generator，回傳處理筆數。
+        """
+        with self.conn:
+            count = self._upsert_gems(gems)
+            self._bump_version()
+        return count
+
+    def _upsert_gems(self, gems):
+        """bulk_save_gems 的寫入部分 (在呼叫端的交易內，不 commit)，回傳處理筆數"""
+        gem_tags = {}
+        count = 0
+        # 已存在的寶石才需要先刪掉舊的標籤對應
+        existing = {r[0] for r in self.cursor.execute('SELECT name FROM skill_gems').fetchall()}
+
+        def rows():
+            nonlocal count
+            for gem in gems:
+                count += 1
+                gem_tags[gem['name']] = split_tags(gem['tags'])
+                yield (gem['name'], gem['tags'], gem['link'], gem_content_hash(gem))
+
+        self.cursor.executemany('''
+            INSERT INTO skill_gems (name, tags, link, content_hash)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                tags = excluded.tags,
+                link = excluded.link,
+                content_hash = excluded.content_hash
+        ''', rows())
+        self._bulk_index_gem_tags(gem_tags, existing)
+        return count
+
+    def _bulk_index_gem_tags(self, gem_tags, existing=None):
+        """一次重建多個寶石的標籤對應，gem_tags 為 {寶石名稱: [標籤]}，existing 為原本就在資料庫的寶石"""
+        all_tags = {tag for tags in gem_tags.values() for tag in tags}
+        self.cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', ((t,) for t in all_tags))
+        tag_ids = dict(self.cursor.execute('SELECT name, id FROM tags').fetchall())
+        gem_ids = dict(self.cursor.execute('SELECT name, id FROM skill_gems').fetchall())
+
+        if existing is None:
+            existing = gem_tags
+        self.cursor.executemany('DELETE FROM gem_tags WHERE gem_id = ?',
+                                ((gem_ids[name],) for name in gem_tags if name in existing))
+        # 依主鍵順序寫入，B-tree 幾乎都是 append
+        pairs = sorted((tag_ids[tag], gem_ids[name]) for name, tags in gem_tags.items() for tag in tags)
+        self.cursor.executemany('INSERT OR IGNORE INTO gem_tags (tag_id, gem_id) VALUES (?, ?)', pairs)
+
+    def _index_gem_tags(self, gem_id, tags_text):
+        """把單一寶石的標籤寫進 tags / gem_tags"""
+        self.cursor.execute('DELETE FROM gem_tags WHERE gem_id = ?', (gem_id,))
+        for tag in split_tags(tags_text):
+            self.cursor.execute('INSERT OR IGNORE INTO tags (name) VALUES (?)', (tag,))
             self.cursor.execute('''
-                INSERT OR REPLACE INTO skill_gems (name, tags, link)
-                VALUES (?, ?, ?)
-            ''', (gem['name'], gem['tags'], gem['link']))
+                INSERT OR IGNORE INTO gem_tags (tag_id, gem_id)
+                SELECT id, ? FROM tags WHERE name = ?
+            ''', (gem_id, tag))
+
+    @metrics.timed("db.rebuild_tag_index")
+    def rebuild_tag_index(self):
+        """依 skill_gems.tags 重建整個標籤對應表 (結果跟原本一樣時不動版本號)"""
+        before = self._tag_index_pairs()
+        self.cursor.execute("DELETE FROM gem_tags")
+        self.cursor.execute("DELETE FROM tags")
+        rows = self.cursor.execute('SELECT id, tags FROM skill_gems').fetchall()
+        for gem_id, tags_text in rows:
+            self._index_gem_tags(gem_id, tags_text)
+        if self._tag_index_pairs() != before:
+            self._bump_version()
+        else:
+            self._refresh_tag_counts()
         self.conn.commit()
 
+    def _tag_index_pairs(self):
+        """目前的 (標籤名稱, 寶石 id) 對應，比對重建前後用"""
+        return sorted(self.cursor.execute(
+            'SELECT t.name, gt.gem_id FROM gem_tags gt JOIN tags t ON t.id = gt.tag_id').fetchall())
+
+    @metrics.timed("db.sync_data")
+    def sync_data(self, ascendancy_list, gems_list, page_hashes=None, support_list=None, staged_pages=None):
+        """
+        差異同步：比對爬到的資料與資料庫，只寫入新增 / 變更 / 刪除的部分。
+        全部在同一個交易內完成，失敗時整批 rollback，其他連線不會讀到一半的資料。
+        某一類資料為空或 None (爬蟲失敗 / 頁面沒變) 時不動該資料表。回傳變更報告。
+        page_hashes ({"ascendancies": 雜湊, "gems": 雜湊, "supports": 雜湊}) 會在同一個交易內記下來。
+        support_list：輔助寶石 (同 gems_list 格式)
+        staged_pages：資料來自暫存區的頁面，同一個交易內清掉暫存 (見 sync_staged)
+        """
+        report = {
+            "ascendancies": {"inserted": [], "deleted": []},
+            "gems": {"inserted": [], "updated": [], "deleted": []},
+            "supports": {"inserted": [], "updated": [], "deleted": []},
+        }
+        with self.conn:
+            if ascendancy_list:
+                self._sync_ascendancies(ascendancy_list, report["ascendancies"])
+            if gems_list:
+                self._sync_gems(gems_list, report["gems"])
+            if support_list:
+                self._sync_supports(support_list, report["supports"])
+            self._save_page_hashes(page_hashes or {}, {"ascendancies": ascendancy_list, "gems": gems_list,
+                                                       "supports": support_list})
+            if staged_pages:
+                self._clear_staging(staged_pages)
+            # 沒有任何變動就不寫入 (連版本號都不動)
+            if any(names for changes in report.values() for names in changes.values()):
+                self._bump_version()
+        return report
+
+    def _save_page_hashes(self, page_hashes, page_data):
+        """只記下真的有寫入資料的頁面，且雜湊有變才寫；雜湊為 None 時刪掉舊的"""
+        stored = self.get_page_hashes()
+        self.cursor.executemany('DELETE FROM page_hashes WHERE page = ?', [
+            (page,) for page, body_hash in page_hashes.items()
+            if body_hash is None and page_data.get(page) and page in stored])
+        rows = [(page, body_hash) for page, body_hash in page_hashes.items()
+                if body_hash is not None and page_data.get(page) and stored.get(page) != body_hash]
+        self.cursor.executemany('''
+            INSERT INTO page_hashes (page, body_hash) VALUES (?, ?)
+            ON CONFLICT (page) DO UPDATE SET body_hash = excluded.body_hash
+        ''', rows)
+
+    def get_page_hashes(self):
+        """{頁面: 上次寫入時的內容雜湊}"""
+        return dict(self.cursor.execute('SELECT page, body_hash FROM page_hashes').fetchall())
+
+    def start_ingest(self, page, body_hash):
+        """
+        開始 (或接續) 暫存一頁，回傳要從第幾列開始寫。
+        同一份內容 (body_hash 相同) 上次寫到一半就從斷點接著寫；內容不同或沒有雜湊則清掉重來。
+        """
+        row = self.cursor.execute('SELECT body_hash, next_row FROM ingest_checkpoints WHERE page = ?',
+                                  (page,)).fetchone()
+        if row and body_hash and row[0] == body_hash:
+            return row[1]
+        with self.conn:
+            self.cursor.execute('DELETE FROM ingest_rows WHERE page = ?', (page,))
+            self.cursor.execute('''
+                INSERT INTO ingest_checkpoints (page, body_hash, next_row, done) VALUES (?, ?, 0, 0)
+                ON CONFLICT (page) DO UPDATE SET body_hash = excluded.body_hash, next_row = 0, done = 0
+            ''', (page, body_hash))
+        return 0
+
+    @metrics.timed("db.stage_rows")
+    def stage_rows(self, page, rows, next_row):
+        """
+        寫入一批暫存列 [(row_no, name, tags, link)] 並把斷點移到 next_row，同一個交易內完成
+        (中斷時不會出現「資料寫了斷點沒動」或反過來的情況)。同名的列以後出現的為準。
+        """
+        with self.conn:
+            self.cursor.executemany('''
+                INSERT INTO ingest_rows (page, row_no, name, tags, link) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (page, name) DO UPDATE SET
+                    row_no = excluded.row_no,
+                    tags = excluded.tags,
+                    link = excluded.link
+            ''', [(page, *row) for row in rows])
+            self.cursor.execute('UPDATE ingest_checkpoints SET next_row = ? WHERE page = ?', (next_row, page))
+
+    def finish_ingest(self, page, body_hash=None):
+        """
+        整頁都寫進暫存區了。body_hash 是讀完整頁時的內容雜湊 (同步時記成這頁的雜湊)，
+        可能跟 start_ingest 時不同 (例如 http 後端被擋、改用 Selenium 重抓)；None 表示不記。
+        """
+        with self.conn:
+            self.cursor.execute('UPDATE ingest_checkpoints SET done = 1, body_hash = ? WHERE page = ?',
+                                (body_hash, page))
+
+    def get_staged_pages(self):
+        """已經完整暫存、還沒同步的頁面 {頁面: 筆數}"""
+        return dict(self.cursor.execute('''
+            SELECT c.page, (SELECT COUNT(*) FROM ingest_rows r WHERE r.page = c.page)
+            FROM ingest_checkpoints c WHERE c.done = 1
+        ''').fetchall())
+
+    def _staged_rows(self, page):
+        rows = self.cursor.execute(
+            'SELECT name, tags, link FROM ingest_rows WHERE page = ? ORDER BY row_no', (page,)).fetchall()
+        if page == "ascendancies":
+            return [name for name, _, _ in rows]
+        return [{"name": name, "tags": tags, "link": link} for name, tags, link in rows]
+
+    def sync_staged(self):
+        """把完整暫存的頁面同步到正式資料表 (走 sync_data 的差異同步)，回傳變更報告"""
+        staged = list(self.get_staged_pages())
+        # 沒有雜湊 (None) 的頁面會清掉舊的雜湊，下次更新一定重新解析
+        hashes = dict(self.cursor.execute(
+            'SELECT page, body_hash FROM ingest_checkpoints WHERE done = 1').fetchall())
+        data = {page: self._staged_rows(page) for page in staged}
+        return self.sync_data(data.get("ascendancies"), data.get("gems"), hashes, data.get("supports"),
+                              staged_pages=staged)
+
+    def _clear_staging(self, pages):
+        self.cursor.executemany('DELETE FROM ingest_rows WHERE page = ?', [(page,) for page in pages])
+        self.cursor.executemany('DELETE FROM ingest_checkpoints WHERE page = ?', [(page,) for page in pages])
+
+    def _sync_ascendancies(self, ascendancy_list, report):
+        stored = {r[0] for r in self.cursor.execute('SELECT name FROM ascendancies').fetchall()}
+        scraped = list(dict.fromkeys(ascendancy_list))
+
+        report["inserted"] = [name for name in scraped if name not in stored]
+        report["deleted"] = sorted(stored - set(scraped))
+        self.cursor.executemany('INSERT INTO ascendancies (name) VALUES (?)',
+                                [(name,) for name in report["inserted"]])
+        self.cursor.executemany('DELETE FROM ascendancies WHERE name = ?',
+                                [(name,) for name in report["deleted"]])
+
+    def _sync_gems(self, gems_list, report):
+        # 同名寶石以最後一筆為準 (跟 INSERT OR REPLACE 一樣)
+        scraped = {gem['name']: gem for gem in gems_list}
+        stored = {name: (gem_id, content_hash) for gem_id, name, content_hash
+                  in self.cursor.execute('SELECT id, name, content_hash FROM skill_gems').fetchall()}
+
+        for name, gem in scraped.items():
+            content_hash = gem_content_hash(gem)
+            if name not in stored:
+                self.cursor.execute(
+                    'INSERT INTO skill_gems (name, tags, link, content_hash) VALUES (?, ?, ?, ?)',
+                    (name, gem['tags'], gem['link'], content_hash))
+                self._index_gem_tags(self.cursor.lastrowid, gem['tags'])
+                report["inserted"].append(name)
+            elif stored[name][1] != content_hash:
+                gem_id = stored[name][0]
+                self.cursor.execute(
+                    'UPDATE skill_gems SET tags = ?, link = ?, content_hash = ? WHERE id = ?',
+                    (gem['tags'], gem['link'], content_hash, gem_id))
+                self._index_gem_tags(gem_id, gem['tags'])
+                # 內容變了，詳細資料之後重抓
+                self.cursor.execute('DELETE FROM gem_details WHERE gem_id = ?', (gem_id,))
+                report["updated"].append(name)
+
+        removed = [(gem_id,) for name, (gem_id, _) in stored.items() if name not in scraped]
+        report["deleted"] = sorted(name for name in stored if name not in scraped)
+        self.cursor.executemany('DELETE FROM skill_gems WHERE id = ?', removed)
+        self.cursor.executemany('DELETE FROM gem_tags WHERE gem_id = ?', removed)
+        self.cursor.executemany('DELETE FROM gem_details WHERE gem_id = ?', removed)
+
+    def _sync_supports(self, support_list, report):
+        scraped = {gem['name']: gem for gem in support_list}
+        stored = dict(self.cursor.execute('SELECT name, content_hash FROM support_gems').fetchall())
+
+        rows = []
+        for name, gem in scraped.items():
+            content_hash = gem_content_hash(gem)
+            if name not in stored:
+                report["inserted"].append(name)
+            elif stored[name] != content_hash:
+                report["updated"].append(name)
+            else:
+                continue
+            rows.append((name, gem['tags'], gem['link'], content_hash))
+        self.cursor.executemany('''
+            INSERT INTO support_gems (name, tags, link, content_hash) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                tags = excluded.tags,
+                link = excluded.link,
+                content_hash = excluded.content_hash
+        ''', rows)
+
+        report["deleted"] = sorted(name for name in stored if name not in scraped)
+        self.cursor.executemany('DELETE FROM support_gems WHERE name = ?', [(name,) for name in report["deleted"]])
+
+    def get_support_gems(self):
+        """所有輔助寶石 [{name, tags, link}] (依 id 排序)，沿用快取"""
+        return self._get_pool("supports", lambda: [
+            {"name": r[0], "tags": r[1], "link": r[2]}
+            for r in self.cursor.execute('SELECT name, tags, link FROM support_gems ORDER BY id').fetchall()])
+
+    @metrics.timed("db.get_build_index")
+    def get_build_index(self):
+        """主動技能 / 輔助寶石的相容表 (builds.BuildIndex)，每個資料版本建一次"""
+        from builds import BuildIndex
+
+        def load():
+            actives = self.get_gems_by_ids(self.get_gem_pool())
+            return BuildIndex(actives, self.get_support_gems())
+        return self._get_pool("build_index", load)
+
     def get_all_tags(self):
-        self.cursor.execute('SELECT tags FROM skill_gems')
-        rows = self.cursor.fetchall()
-        unique_tags = set()
-        for row in rows:
-            if row[0]:
-                tags = [t.strip() for t in row[0].split(',')]
-                unique_tags.update(tags)
-        return sorted(list(unique_tags))
+        """所有標籤 (已排序)"""
+        return [name for name, _ in self.get_tag_counts()]
 
-    def get_random_ascendancies(self, count=1):
+    @metrics.timed("db.get_tag_counts")
+    def get_tag_counts(self):
         """
-        隨機回傳指定數量的昇華職業
+        所有標籤與對應的寶石數 [(標籤, 數量)]，讀取維護好的 tags 表並依資料版本快取
         """
-        self.cursor.execute('SELECT name FROM ascendancies ORDER BY RANDOM() LIMIT ?', (count,))
-        results = self.cursor.fetchall()
-        # results 結構是 [('衛士',), ('死靈',)]，轉成 list
-        return [r[0] for r in results] if results else []
+        return self._get_pool("tag_counts", lambda: self.cursor.execute(
+            'SELECT name, gem_count FROM tags ORDER BY name').fetchall())
+
+    def _get_pool(self, key, loader):
+        """
+        取得候選池 (list)，同一個 key 在資料版本不變時直接用記憶體裡的結果
+        """
+        version = self.get_data_version()
+        cached = self._pools.get(key)
+        if cached and cached[0] == version:
+            metrics.count("db.pool_hit")
+            return cached[1]
+        metrics.count("db.pool_miss")
+        pool = loader()
+        self._pools[key] = (version, pool)
+        # 篩選組合太多時丟掉最舊的
+        if len(self._pools) > 32:
+            self._pools.pop(next(iter(self._pools)))
+        return pool
+
+    def _get_sampler(self, seed):
+        """有 seed 時用獨立的 Sampler，同樣的 seed + 資料就會抽出同樣結果"""
+        return self._sampler if seed is None else Sampler(seed)
 
-    def get_random_gems(self, include_tags=None, exclude_tags=None, count=1):
+    @metrics.timed("db.get_random_ascendancies")
+    def get_random_ascendancies(self, count=1, seed=None):
+        """
+        隨機回傳指定數量的昇華職業 (O(count)，不再每次 ORDER BY RANDOM())
+        """
+        return self._get_sampler(seed).sample(self.get_ascendancy_pool(), count)
+
+    def get_ascendancy_pool(self):
+        """所有昇華職業名稱 (依 id 排序)，沿用快取"""
+        return self._get_pool("ascendancies", lambda: [
+            r[0] for r in self.cursor.execute('SELECT name FROM ascendancies ORDER BY id').fetchall()])
+
+    @metrics.timed("db.get_random_gems")
+    def get_random_gems(self, include_tags=None, exclude_tags=None, count=1, seed=None):
         """
         隨機抽取指定數量的寶石
         """
-        query = "SELECT name, tags, link FROM skill_gems WHERE 1=1"
-        params = []
+        gem_ids = self.get_gem_pool(include_tags, exclude_tags)
+        picked = self._get_sampler(seed).sample(gem_ids, count)
+        return self.get_gems_by_ids(picked)
+
+    # --- 加權抽籤 (alias method) ---
+
+    def _item_weight(self, name, tags=()):
+        """名稱權重 x 各標籤倍率"""
+        weight = self.weights.get(name, 1.0)
+        for tag in tags:
+            weight *= self.tag_weights.get(tag, 1.0)
+        return weight
+
+    def _weighted_entry(self, items, names, tag_lists):
+        """候選池 + 名稱索引 + 權重表，放進 _pools 快取 (一樣依資料版本失效)"""
+        table = WeightedPool([self._item_weight(name, tags) for name, tags in zip(names, tag_lists)])
+        return {"items": items, "index": {name: i for i, name in enumerate(names)},
+                "tags": tag_lists, "table": table}
+
+    def get_weighted_ascendancy_pool(self):
+        """{"items": 昇華名稱, "table": WeightedPool, ...}，每個資料版本只建一次"""
+        def load():
+            names = self.get_ascendancy_pool()
+            return self._weighted_entry(names, names, [()] * len(names))
+        return self._get_pool(("weighted", "ascendancies"), load)
+
+    def get_weighted_gem_pool(self, include_tags=None, exclude_tags=None):
+        """{"items": 寶石 dict, "table": WeightedPool, ...}，每組篩選條件 + 資料版本只建一次"""
+        key = ("weighted", "gems", frozenset(include_tags or ()), frozenset(exclude_tags or ()))
+
+        def load():
+            gems = self.get_gems_by_ids(self.get_gem_pool(include_tags, exclude_tags))
+            return self._weighted_entry(gems, [g['name'] for g in gems], [split_tags(g['tags']) for g in gems])
+        return self._get_pool(key, load)
+
+    @metrics.timed("db.get_weighted_ascendancies")
+    def get_weighted_ascendancies(self, count=1, seed=None):
+        """依權重抽取不重複的昇華職業"""
+        entry = self.get_weighted_ascendancy_pool()
+        return self._get_sampler(seed).weighted_sample(entry["items"], entry["table"], count)
+
+    @metrics.timed("db.get_weighted_gems")
+    def get_weighted_gems(self, include_tags=None, exclude_tags=None, count=1, seed=None):
+        """依權重抽取不重複的寶石"""
+        entry = self.get_weighted_gem_pool(include_tags, exclude_tags)
+        return [dict(g) for g in self._get_sampler(seed).weighted_sample(entry["items"], entry["table"], count)]
+
+    def _weighted_keys(self):
+        return [key for key in self._pools if isinstance(key, tuple) and key[0] == "weighted"]
+
+    def _weighted_entries(self):
+        return [self._pools[key][1] for key in self._weighted_keys()]
+
+    def set_weights(self, weights):
+        """
+        設定 (部分) 名稱的權重。已經建好的權重表只重建有變動的區塊，不整張重建
+        """
+        self.weights.update(weights)
+        for entry in self._weighted_entries():
+            changes = {}
+            for name in weights:
+                i = entry["index"].get(name)
+                if i is not None:
+                    changes[i] = self._item_weight(name, entry["tags"][i])
+            entry["table"].update(changes)
 
-        if include_tags:
-            for tag in include_tags:
-                query += " AND tags LIKE ?"
-                params.append(f'%{tag}%')
+    def decay_weights(self, names, factor=0.5):
+        """把剛抽到的項目權重乘上 factor (降低短時間內重複出現的機率)"""
+        self.set_weights({name: self.weights.get(name, 1.0) * factor for name in names})
 
-        if exclude_tags:
-            for tag in exclude_tags:
-                query += " AND tags NOT LIKE ?"
-                params.append(f'%{tag}%')
+    def set_tag_weights(self, tag_weights):
+        """設定標籤倍率 (會影響大量寶石，權重表下次使用時整張重建)"""
+        self.tag_weights = dict(tag_weights)
+        for key in self._weighted_keys():
+            del self._pools[key]
 
-        # 加上隨機排序與數量限制~~
-        query += " ORDER BY RANDOM() LIMIT ?"
-        params.append(count)
+    def load_weights(self, path):
+        """
+        讀取人氣 / 權重檔：JSON ({"名稱": 權重}) 或 CSV (名稱,權重)
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                weights = {name: float(w) for name, w in json.load(f).items()}
+            else:
+                weights = {row[0]: float(row[1]) for row in csv.reader(f)
+                           if len(row) >= 2 and row[1].strip().replace(".", "", 1).isdigit()}
+        self.set_weights(weights)
+        return weights
+
+    @metrics.timed("db.search_gems")
+    def search_gems(self, text, limit=50):
+        """
+        依名稱 / 標籤搜尋寶石 (子字串比對，不分大小寫)，給輸入即搜尋用。
+        排序：名稱開頭符合 > 名稱包含 > 只有標籤符合，同級再依名稱。
+        3 個字以上走 FTS5 trigram 索引；更短 (例如中文 1~2 字) trigram 切不出詞，改用 LIKE 掃描。
+        """
+        text = " ".join(text.split())
+        if not text:
+            return []
+        # 排序在 SQL 裡做完再 LIMIT，符合的寶石很多時也只取 limit 筆
+        order = "ORDER BY instr(lower(name), ?1) != 1, instr(lower(name), ?1) = 0, name COLLATE NOCASE LIMIT ?2"
+        needle = text.lower()
+        if self.has_fts and len(text) >= 3:
+            # 整段當成一個片語，避免使用者輸入的引號 / 運算子被解讀成 FTS 語法
+            phrase = '"' + text.replace('"', '""') + '"'
+            rows = self.cursor.execute(
+                f"SELECT rowid FROM gem_search WHERE gem_search MATCH ?3 {order}", (needle, limit, phrase)).fetchall()
+        else:
+            pattern = "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+            rows = self.cursor.execute(
+                f"SELECT id FROM skill_gems WHERE name LIKE ?3 ESCAPE '\\' OR tags LIKE ?3 ESCAPE '\\' {order}",
+                (needle, limit, pattern)).fetchall()
+        return self.get_gems_by_ids([row[0] for row in rows])
+
+    @metrics.timed("db.get_gems_by_ids")
+    def get_gems_by_ids(self, gem_ids):
+        """
+        依 id 取出寶石 [{name, tags, link}]，保留傳入的順序。
+        抽樣後到這裡之間被刪掉的寶石 (例如背景更新同時在同步) 直接略過，回傳的筆數可能比較少
+        """
+        rows = {}
+        # 分批查詢，避免超過 SQLite 的參數數量上限
+        for i in range(0, len(gem_ids), 900):
+            chunk = gem_ids[i:i + 900]
+            placeholders = ",".join("?" * len(chunk))
+            self.cursor.execute(f"SELECT id, name, tags, link FROM skill_gems WHERE id IN ({placeholders})", chunk)
+            rows.update((r[0], r) for r in self.cursor.fetchall())
 
-        self.cursor.execute(query, tuple(params))
-        rows = self.cursor.fetchall()
-        
         # 將結果包裝成字典列表回傳
         gems = []
-        for r in rows:
+        for gem_id in gem_ids:
+            r = rows.get(gem_id)
+            if r is None:
+                continue
             gems.append({
-                "name": r[0],
-                "tags": r[1],
-                "link": r[2]
+                "name": r[1],
+                "tags": r[2],
+                "link": r[3]
             })
         return gems
-    
+
+    @metrics.timed("db.get_gem_pool")
+    def get_gem_pool(self, include_tags=None, exclude_tags=None):
+        """
+        符合篩選條件的寶石 id (依 id 排序)，同樣的條件會沿用快取
+        """
+        key = ("gems", frozenset(include_tags or ()), frozenset(exclude_tags or ()))
+
+        def load():
+            # 標籤篩選走 gem_tags 索引 (整個標籤比對，不會有子字串誤判)
+            query, params = self._build_gem_id_query(include_tags, exclude_tags)
+            return sorted(r[0] for r in self.cursor.execute(query, params).fetchall())
+
+        return self._get_pool(key, load)
+
+    def _build_gem_id_query(self, include_tags=None, exclude_tags=None):
+        """
+        組出篩選寶石 id 的 SQL：包含 = INTERSECT，排除 = EXCEPT
+        """
+        tag_gems = "SELECT gem_id FROM gem_tags WHERE tag_id = (SELECT id FROM tags WHERE name = ?)"
+        query = "SELECT id FROM skill_gems"
+        params = []
+        for tag in include_tags or []:
+            query += f" INTERSECT {tag_gems}"
+            params.append(tag)
+        for tag in exclude_tags or []:
+            query += f" EXCEPT {tag_gems}"
+            params.append(tag)
+        return query, params
+
+    def get_gems_for_enrichment(self, only_missing=True):
+        """
+        需要補詳細資料的寶石 [(id, link)]，only_missing=False 時回傳全部
+        """
+        query = "SELECT id, link FROM skill_gems WHERE link IS NOT NULL AND link != ''"
+        if only_missing:
+            query += " AND id NOT IN (SELECT gem_id FROM gem_details)"
+        return self.cursor.execute(query + " ORDER BY id").fetchall()
+
+    @metrics.timed("db.save_gem_details")
+    def save_gem_details(self, details):
+        """
+        寫入一批寶石詳細資料，details 為 [(gem_id, {level, colour, mana_cost, quality})]
+        """
+        with self.conn:
+            self._write_gem_details(details)
+
+    def _write_gem_details(self, details):
+        """save_gem_details 的寫入部分 (在呼叫端的交易內，不 commit)"""
+        self.cursor.executemany('''
+            INSERT INTO gem_details (gem_id, level, colour, mana_cost, quality, fetched_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT (gem_id) DO UPDATE SET
+                level = excluded.level,
+                colour = excluded.colour,
+                mana_cost = excluded.mana_cost,
+                quality = excluded.quality,
+                fetched_at = excluded.fetched_at
+        ''', [(gem_id, d.get("level"), d.get("colour"), d.get("mana_cost"), d.get("quality"))
+              for gem_id, d in details])
+
+    def get_gem_details(self, name):
+        """單一寶石的詳細資料，還沒抓過回傳 None"""
+        self.cursor.execute('''
+            SELECT d.level, d.colour, d.mana_cost, d.quality
+            FROM gem_details d JOIN skill_gems g ON g.id = d.gem_id
+            WHERE g.name = ?
+        ''', (name,))
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        return {"level": row[0], "colour": row[1], "mana_cost": row[2], "quality": row[3]}
+
+    @metrics.timed("db.clear_all_data")
     def clear_all_data(self):
         """
         清空所有資料表 (用於語言切換或強制更新時)
         """
+        self._clear_tables()
+        self._bump_version()
+        self.conn.commit()
+
+    @metrics.timed("db.replace_all_data")
+    def replace_all_data(self, ascendancy_list, gems, support_list, details):
+        """
+        整批換掉所有資料 (快照匯入用)：清空與寫入都在同一個交易內，
+        中途失敗整批 rollback，原本的資料不動，其他連線也不會讀到空的或一半的資料庫。
+        gems / support_list 為 [{name, tags, link}]，details 為 [(寶石名稱, {level, colour, mana_cost, quality})]
+        """
+        with self.conn:
+            self._clear_tables()
+            self.cursor.executemany('INSERT OR IGNORE INTO ascendancies (name) VALUES (?)',
+                                    ((name,) for name in ascendancy_list))
+            self._upsert_gems(gems)
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO support_gems (name, tags, link, content_hash) VALUES (?, ?, ?, ?)
+            ''', [(gem['name'], gem['tags'], gem['link'], gem_content_hash(gem)) for gem in support_list])
+            gem_ids = dict(self.cursor.execute('SELECT name, id FROM skill_gems').fetchall())
+            self._write_gem_details([(gem_ids[name], d) for name, d in details if name in gem_ids])
+            self._bump_version()
+
+    def _clear_tables(self):
+        """clear_all_data 的刪除部分 (在呼叫端的交易內，不 commit)"""
         self.cursor.execute("DELETE FROM ascendancies")
         self.cursor.execute("DELETE FROM skill_gems")
+        self.cursor.execute("DELETE FROM support_gems")
+        self.cursor.execute("DELETE FROM gem_tags")
+        self.cursor.execute("DELETE FROM tags")
+        self.cursor.execute("DELETE FROM gem_details")
+        self.cursor.execute("DELETE FROM page_hashes")
+        self.cursor.execute("DELETE FROM ingest_rows")
+        self.cursor.execute("DELETE FROM ingest_checkpoints")
         # 選擇性：重置 ID 計數器 (讓 ID 從 1 開始)
         self.cursor.execute("DELETE FROM sqlite_sequence WHERE name='ascendancies'")
         self.cursor.execute("DELETE FROM sqlite_sequence WHERE name='skill_gems'")
-        self.conn.commit()
+        self.cursor.execute("DELETE FROM sqlite_sequence WHERE name='support_gems'")
+        self.cursor.execute("DELETE FROM sqlite_sequence WHERE name='tags'")
+
+    def close(self):
+        self.conn.close()
+
+class LocaleDatabases:
+    """
+    依語言代碼延遲開啟各自的 PoeDatabase，切換語言只是換一條連線，不用重新爬資料
+    第一次開啟 (資料庫是空的) 時，有該語言的快照檔就直接匯入 (見 snapshot.py)
+    """
+    def __init__(self):
+        self._dbs = {}
+
+    def get(self, lang_code):
+        if lang_code not in self._dbs:
+            migrate_legacy_db(lang_code)
+            db = PoeDatabase(locale_db_name(lang_code))
+            seed_database(db, lang_code)
+            self._dbs[lang_code] = db
+        return self._dbs[lang_code]
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        for db in self._dbs.values():
+            db.close()
+        self._dbs = {}
@@ -0,0 +1,191 @@
+# enricher.py
+# 寶石詳細資料補充：依 skill_gems.link 同時抓取每個寶石頁面，
+# 解析需求等級 / 屬性顏色 / 魔力消耗 / 品質效果，寫進 gem_details
+import argparse
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+from database import PoeDatabase, locale_db_name
+import locales
+import metrics
+
+# 表格列的標題 (中英文)，比對時忽略大小寫
+# 不收單獨的 "level" / "等級"：等級成長表的表頭也是這兩個字
+LEVEL_LABELS = ("requires level", "需求等級")
+COST_LABELS = ("cost", "mana cost", "cost & reservation", "消耗", "魔力消耗")
+QUALITY_LABELS = ("quality", "品質")
+
+# 寶石自己的標題 (頁面上第一個 card-header)；顏色只在這裡面找，避免抓到「相關寶石」等連結的顏色
+GEM_HEADER_SELECTOR = ".card-header"
+# poedb 用 class 標示寶石顏色
+COLOUR_CLASSES = {
+    "gem_red": "red",
+    "gem_green": "green",
+    "gem_blue": "blue",
+    "gem_white": "white",
+}
+
+# 這些狀態碼視為暫時性錯誤，退避後重試
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+def _first_int(text):
+    match = re.search(r"\d+", text or "")
+    return int(match.group()) if match else None
+
+def _text(elem):
+    return " ".join(elem.get_text(" ").split())
+
+def parse_gem_detail(html):
+    """
+    從寶石頁面 HTML 解析詳細資料，找不到的欄位為 None。
+    只看「標題 / 數值」剛好兩欄的表格列 (等級成長表那種多欄表格不算)，
+    顏色則看寶石標題裡的 gem_red / gem_green / gem_blue / gem_white class。
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    detail = {"level": None, "colour": None, "mana_cost": None, "quality": None}
+    quality_lines = []
+
+    for row in soup.select("tr"):
+        cells = row.find_all(["th", "td"], recursive=False)
+        if len(cells) != 2:
+            continue
+        label = _text(cells[0]).lower()
+        value = _text(cells[-1])
+        if detail["level"] is None and label in LEVEL_LABELS:
+            detail["level"] = _first_int(value)
+        elif detail["mana_cost"] is None and label in COST_LABELS:
+            detail["mana_cost"] = _first_int(value)
+        elif any(q in label for q in QUALITY_LABELS) and value:
+            quality_lines.append(value)
+
+    header = soup.select_one(GEM_HEADER_SELECTOR)
+    if header is not None:
+        for elem in [header] + header.find_all(class_=True):
+            colour = next((COLOUR_CLASSES[c] for c in elem.get("class", []) if c in COLOUR_CLASSES), None)
+            if colour:
+                detail["colour"] = colour
+                break
+
+    if quality_lines:
+        detail["quality"] = "\n".join(quality_lines)
+    return detail
+
+class DetailFetcher:
+    """
+    多執行緒抓頁面：每個 host 同時最多 per_host 個請求，暫時性錯誤以指數退避重試。
+    每次最多等 max_backoff 秒 (預設是指數退避最後一次的上限)，伺服器的 Retry-After 也不會超過它。
+    requests.Session 每個 thread 各一個。
+    """
+    def __init__(self, per_host=8, retries=3, backoff=0.5, timeout=10, max_backoff=None):
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_backoff = max_backoff if max_backoff is not None else backoff * 2 ** (retries + 1)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.Semaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["User-Agent"] = "Mozilla/5.0"
+        return self._local.session
+
+    def _retry_delay(self, retry_after, attempt):
+        """
+        這次重試前要等幾秒：Retry-After 是秒數時照它 (最多 max_backoff)，
+        沒有或是 HTTP 日期格式時用指數退避
+        """
+        retry_after = (retry_after or "").strip()
+        if retry_after.isdigit() and int(retry_after) > 0:
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt) * (1 + random.random()), self.max_backoff)
+
+    @metrics.timed("enricher.fetch")
+    def fetch(self, url):
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            with self._slot(url):
+                try:
+                    resp = self._session().get(url, timeout=self.timeout)
+                    if resp.status_code not in RETRY_STATUS:
+                        resp.raise_for_status()
+                        return resp.text
+                    metrics.count("enricher.retry")
+                    retry_after = resp.headers.get("Retry-After")
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+            if attempt == self.retries:
+                resp.raise_for_status()
+            # 退避時先讓出名額，不佔住 host 的同時連線數
+            time.sleep(self._retry_delay(retry_after, attempt))
+
+def enrich_gems(db, max_workers=16, per_host=8, only_missing=True, batch_size=50, fetcher=None):
+    """
+    抓取所有寶石頁面並寫入 gem_details。
+    抓完一頁就交回主執行緒，每 batch_size 筆寫入一次 (SQLite 連線只在主執行緒使用)。
+    回傳 {"total", "saved", "failed", "seconds"}
+    """
+    gems = db.get_gems_for_enrichment(only_missing)
+    fetcher = fetcher or DetailFetcher(per_host=per_host)
+    stats = {"total": len(gems), "saved": 0, "failed": 0}
+    start = time.perf_counter()
+    batch = []
+
+    def work(link):
+        return parse_gem_detail(fetcher.fetch(link))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(work, link): gem_id for gem_id, link in gems}
+        for future in as_completed(futures):
+            try:
+                batch.append((futures[future], future.result()))
+            except Exception as e:
+                stats["failed"] += 1
+                metrics.count("enricher.failed")
+                print(f"Error: {e}")
+                continue
+            if len(batch) >= batch_size:
+                db.save_gem_details(batch)
+                stats["saved"] += len(batch)
+                batch = []
+
+    if batch:
+        db.save_gem_details(batch)
+        stats["saved"] += len(batch)
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"[timing] gem details: {stats['saved']}/{stats['total']} pages in {stats['seconds']:.2f}s, {stats['failed']} failed")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="補充寶石詳細資料 (需求等級、顏色、魔力消耗、品質)")
+    parser.add_argument("--lang", nargs="+", choices=list(locales.TRANSLATIONS), dest="langs",
+                        help="只處理指定語言 (預設全部)")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=8, help="同一個網站的同時連線數上限")
+    parser.add_argument("--all", action="store_true", help="已有資料的寶石也重新抓取")
+    args = parser.parse_args()
+
+    for lang_code in args.langs or list(locales.TRANSLATIONS):
+        db = PoeDatabase(locale_db_name(lang_code))
+        try:
+            enrich_gems(db, args.workers, args.per_host, only_missing=not args.all)
+        finally:
+            db.close()
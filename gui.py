@@ -1,21 +1,155 @@
 # gui.py
+import time
+_START_TIME = time.perf_counter()  # 啟動計時起點 (盡量放在最前面)
+
 import tkinter as tk
 from tkinter import ttk, messagebox
 import webbrowser
 import threading
+import queue
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from database import PoeDatabase
-from scraper import PoeScraper
+# 爬蟲相關 (selenium / requests / bs4) 只有在按下「更新資料庫」時才載入，見 run_update_task
+from database import LocaleDatabases
+from roll_session import RollSession, session_path
 import locales
+import metrics
 
 # 設定檔名稱
 CONFIG_FILE = "config.json"
+# 一次最多抽幾個技能 (結果表分頁顯示，數量大也不會卡住)
+MAX_GEM_ROLL = 5000
+# 搜尋框停止輸入多久 (毫秒) 才查詢，以及最多顯示幾筆
+SEARCH_DELAY = 120
+SEARCH_LIMIT = 200
+# 冷啟動時間預算 (秒)，超過時在 console 提醒
+STARTUP_BUDGET = 1.0
+# 設定這個環境變數 (檔案路徑) 時，每次啟動把計時結果以 JSON 一行附加進去
+STARTUP_REPORT_ENV = "POE_STARTUP_REPORT"
+
+_IMPORT_TIME = time.perf_counter() - _START_TIME
+
+def format_sync_report(report):
+    """把 sync_data 的變更報告轉成一行摘要 (有沒抓完的頁面時多一行)"""
+    summary = locales.get_text("update_summary").format(
+        gem_add=len(report["gems"]["inserted"]),
+        gem_upd=len(report["gems"]["updated"]),
+        gem_del=len(report["gems"]["deleted"]),
+        sup_add=len(report["supports"]["inserted"]),
+        sup_upd=len(report["supports"]["updated"]),
+        sup_del=len(report["supports"]["deleted"]),
+        asc_add=len(report["ascendancies"]["inserted"]),
+        asc_del=len(report["ascendancies"]["deleted"]),
+    )
+    if report.get("incomplete"):
+        summary += "\n" + locales.get_text("update_incomplete").format(pages=", ".join(report["incomplete"]))
+    return summary
+
+class TaskQueue:
+    """
+    背景執行緒 -> Tk 主執行緒的訊息佇列。
+    Tkinter 元件只能在主執行緒操作，背景工作用 post() 丟回呼，主執行緒每 interval 毫秒取出執行。
+    """
+    def __init__(self, root, interval=50):
+        self.root = root
+        self.interval = interval
+        self._queue = queue.Queue()
+        self.root.after(self.interval, self._poll)
+
+    def post(self, callback, *args):
+        """可在任何執行緒呼叫"""
+        self._queue.put((callback, args))
+
+    def _poll(self):
+        try:
+            while True:
+                callback, args = self._queue.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"UI Callback Error: {e}")
+        except queue.Empty:
+            pass
+        self.root.after(self.interval, self._poll)
+
+class ResultView:
+    """
+    分頁顯示的 Treeview：資料整批保留在記憶體，畫面上只放目前這一頁，
+    而且分批插入 (每次 after 插 batch 筆)，幾千筆結果也不會讓視窗卡住。
+    點欄位標題排序 (不重新查詢)，再點一次反向。
+    """
+    def __init__(self, tree, columns, page_size=200, batch=50, on_page=None):
+        self.tree = tree
+        self.columns = columns
+        self.page_size = page_size
+        self.batch = batch
+        self.on_page = on_page  # on_page(page, pages, total)：換頁時通知外面更新頁碼
+        self.rows = []
+        self.page = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self._job = None
+        for col in columns:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
+
+    @property
+    def pages(self):
+        return max(1, (len(self.rows) + self.page_size - 1) // self.page_size)
+
+    def set_rows(self, rows):
+        """換一批資料 (list of dict)，保留目前的排序方式"""
+        self.rows = list(rows)
+        if self.sort_column:
+            self._sort()
+        self.show_page(0)
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column, self.sort_reverse = column, False
+        self._sort()
+        self.show_page(0)
+
+    def _sort(self):
+        key = self.columns[self.sort_column]
+        self.rows.sort(key=lambda row: str(row[key]).lower(), reverse=self.sort_reverse)
+
+    def show_page(self, page):
+        self.page = min(max(0, page), self.pages - 1)
+        if self._job:
+            self.tree.after_cancel(self._job)
+            self._job = None
+        # 一次刪掉全部，比逐筆 delete 快很多
+        self.tree.delete(*self.tree.get_children())
+        start = self.page * self.page_size
+        self._fill(start, min(start + self.page_size, len(self.rows)))
+        if self.on_page:
+            self.on_page(self.page + 1, self.pages, len(self.rows))
+
+    def next_page(self):
+        self.show_page(self.page + 1)
+
+    def prev_page(self):
+        self.show_page(self.page - 1)
+
+    def _fill(self, start, end):
+        stop = min(start + self.batch, end)
+        keys = list(self.columns.values())
+        for row in self.rows[start:stop]:
+            self.tree.insert("", "end", values=[row[k] for k in keys])
+        # 剩下的交給下一輪事件迴圈，中間可以處理重繪與使用者操作
+        self._job = self.tree.after(1, self._fill, stop, end) if stop < end else None
 
 class PoeApp(tk.Tk):
     def __init__(self):
         super().__init__()
+        self.scraper_backend = "http"
+        self.scrape_workers = 4
+        # selenium 後端的瀏覽器在多次更新之間保留 (第一次更新時才開)
+        self.browser_session = None
         self.load_config()
         
         self.title(locales.get_text("app_title"))
@@ -36,22 +170,103 @@ class PoeApp(tk.Tk):
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
         
-        self.db = PoeDatabase()
+        # 每個語言各自一個資料庫，用到時才開啟
+        self.dbs = LocaleDatabases()
+        # 查詢都在這條專用執行緒上跑 (SQLite 連線只在建立它的執行緒使用)，結果經由 tasks 回到主執行緒
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        # 每個資料庫一個不重複抽籤 session (只在資料庫執行緒使用)
+        self.roll_sessions = {}
+        self.tasks = TaskQueue(self)
         
+        # 頁面在第一次顯示時才建立 (AppPage 要讀資料庫，不要拖慢封面出現)
+        self.page_classes = {"MainMenu": MainMenu, "AppPage": AppPage}
         self.frames = {}
-        
-        for F in (MainMenu, AppPage):
-            page_name = F.__name__
-            frame = F(parent=self.container, controller=self)
+
+        self.show_frame("MainMenu")
+
+        self.startup_timing = {"import": _IMPORT_TIME, "init": time.perf_counter() - _START_TIME}
+        self.after(0, self.report_startup)
+
+    def report_startup(self):
+        """第一個畫面畫出來後回報啟動時間"""
+        self.update_idletasks()
+        timing = self.startup_timing
+        timing["first_frame"] = time.perf_counter() - _START_TIME
+        print(f"[startup] import {timing['import']:.3f}s, init {timing['init']:.3f}s, "
+              f"first frame {timing['first_frame']:.3f}s (budget {STARTUP_BUDGET:.1f}s)")
+        if timing["first_frame"] > STARTUP_BUDGET:
+            print("[startup] WARNING: cold start is over budget")
+
+        report_path = os.environ.get(STARTUP_REPORT_ENV)
+        if report_path:
+            record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "budget": STARTUP_BUDGET}
+            record.update({k: round(v, 4) for k, v in timing.items()})
+            with open(report_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def get_frame(self, page_name):
+        """取得頁面，還沒建立就現在建立"""
+        if page_name not in self.frames:
+            frame = self.page_classes[page_name](parent=self.container, controller=self)
             self.frames[page_name] = frame
             # 這裡一樣要 sticky="nsew"
             frame.grid(row=0, column=0, sticky="nsew")
-
-        self.show_frame("MainMenu")
+        return self.frames[page_name]
+
+    def run_db(self, func, on_done, on_error=None, name=None):
+        """
+        在資料庫執行緒上執行 func(目前語言的資料庫)，完成後在主執行緒呼叫 on_done(結果)
+        語言在送出時就決定，之後切換語言不影響這次查詢
+        name：有開 metrics 時記下 gui.<name>.queue / query / render / total 的時間
+        """
+        lang_code = locales.get_lang_code()
+        submitted = time.perf_counter()
+
+        def render(result):
+            start = time.perf_counter()
+            on_done(result)
+            if name:
+                end = time.perf_counter()
+                metrics.record(f"gui.{name}.render", end - start)
+                metrics.record(f"gui.{name}.total", end - submitted)
+
+        def job():
+            start = time.perf_counter()
+            try:
+                result = func(self.dbs.get(lang_code))
+            except Exception as e:
+                print(f"DB Error: {e}")
+                metrics.count("gui.db_errors")
+                if on_error:
+                    self.tasks.post(on_error, e)
+                return
+            if name:
+                metrics.record(f"gui.{name}.queue", start - submitted)
+                metrics.record(f"gui.{name}.query", time.perf_counter() - start)
+            self.tasks.post(render, result)
+
+        return self.db_executor.submit(job)
+
+    def roll_session(self, db):
+        """
+        db 對應的不重複抽籤 session (第一次用到時從磁碟讀回)，只能在資料庫執行緒呼叫。
+        每次抽籤不寫檔，切換語言與關閉視窗時才寫 (見 flush_roll_sessions)
+        """
+        if db.db_name not in self.roll_sessions:
+            self.roll_sessions[db.db_name] = RollSession(session_path(db.db_name), autosave=False)
+        return self.roll_sessions[db.db_name]
+
+    def flush_roll_sessions(self):
+        """把有變動的抽籤 session 寫回檔案 (在資料庫執行緒上執行)"""
+        for session in self.roll_sessions.values():
+            try:
+                session.flush()
+            except OSError as e:
+                print(f"Roll session save failed: {e}")
 
     def show_frame(self, page_name):
         """切換顯示頁面"""
-        frame = self.frames[page_name]
+        frame = self.get_frame(page_name)
         frame.update_text() # 切換時重新刷新文字 (確保語言變更生效)
         frame.tkraise() # 將該頁面推到最上層
 
@@ -66,8 +281,15 @@ class PoeApp(tk.Tk):
         # 刷新所有頁面的文字
         for frame in self.frames.values():
             frame.update_text()
+
+        # 換到該語言的資料庫：舊語言的標籤規則不適用，一併清除
+        app_page = self.frames.get("AppPage")
+        if app_page:
+            app_page.clear_filters()
+            app_page.refresh_tags()
             
         self.save_config() # 儲存設定
+        self.db_executor.submit(self.flush_roll_sessions)
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
@@ -75,12 +297,20 @@ class PoeApp(tk.Tk):
                 with open(CONFIG_FILE, "r") as f:
                     config = json.load(f)
                     locales.set_lang(config.get("lang", "tw"))
+                    # 爬蟲後端：http (預設) 或 selenium
+                    self.scraper_backend = config.get("scraper_backend", "http")
+                    # 同時爬取的頁面數上限
+                    self.scrape_workers = config.get("scrape_workers", 4)
             except:
                 pass
 
     def save_config(self):
         with open(CONFIG_FILE, "w") as f:
-            json.dump({"lang": locales.current_lang}, f)
+            json.dump({
+                "lang": locales.current_lang,
+                "scraper_backend": self.scraper_backend,
+                "scrape_workers": self.scrape_workers,
+            }, f)
             
     def run_update_task(self):
         """執行資料庫更新 (背景執行)"""
@@ -90,58 +320,100 @@ class PoeApp(tk.Tk):
         loading = tk.Toplevel(self)
         loading.title("Updating...")
         # 稍微調整一下 loading 視窗的大小和位置
-        loading.geometry(f"300x120+{self.winfo_x() + 250}+{self.winfo_y() + 250}")
+        loading.geometry(f"360x170+{self.winfo_x() + 220}+{self.winfo_y() + 250}")
         
-        lbl_loading = tk.Label(loading, text=locales.get_text("update_running"), pady=20, font=("Arial", 10))
+        lbl_loading = tk.Label(loading, text=locales.get_text("update_running"), pady=15, font=("Arial", 10))
         lbl_loading.pack()
+        # 每頁 / 每個語言完成時的進度
+        lbl_progress = tk.Label(loading, text="", font=("Arial", 9), fg="#555")
+        lbl_progress.pack()
+
+        cancel_event = threading.Event()
+
+        def cancel():
+            cancel_event.set()
+            btn_cancel.config(state="disabled")
+            lbl_loading.config(text=locales.get_text("update_cancelling"))
+
+        btn_cancel = tk.Button(loading, text=locales.get_text("btn_cancel"), command=cancel, width=10)
+        btn_cancel.pack(pady=10)
+        loading.protocol("WM_DELETE_WINDOW", cancel)
         
         loading.transient(self)
         loading.grab_set()
-        self.update()
+
+        # 延遲載入：只有更新時才需要爬蟲相關模組
+        from http_cache import HttpCache
+        from init_data import update_locales
+        from scraper import BrowserSession, UpdateCancelled
+
+        if self.scraper_backend == "selenium" and self.browser_session is None:
+            self.browser_session = BrowserSession(headless=True)
+
+        # 以下都在主執行緒執行 (由 task 透過 self.tasks 丟回來)
+        def show_progress(text):
+            if loading.winfo_exists():
+                lbl_progress.config(text=text)
+
+        def finish(reports):
+            loading.destroy()
+            summary = "\n".join(f"[{code.upper()}]\n{format_sync_report(r)}" for code, r in reports.items())
+            messagebox.showinfo("Success", locales.get_text("update_success") + "\n\n" + summary)
+            self.refresh_app_tags()
+
+        def cancelled():
+            loading.destroy()
+            messagebox.showinfo("Cancelled", locales.get_text("update_cancelled"))
+            # 取消前已寫入的語言仍然有效
+            self.refresh_app_tags()
+
+        def failed(e):
+            loading.destroy()
+            messagebox.showerror("Error", f"{locales.get_text('update_fail')}\n{e}")
+
+        def on_page_done(code, page, progress):
+            if progress is None:
+                text = locales.get_text("update_page_unchanged").format(lang=code, page=page)
+            elif not progress.complete:
+                text = locales.get_text("update_page_incomplete").format(lang=code, page=page, rows=progress.rows)
+            else:
+                text = locales.get_text("update_page_done").format(lang=code, page=page, rows=progress.rows)
+            self.tasks.post(show_progress, text)
+
+        def on_saved(code, report):
+            rows = sum(len(v) for table, section in report.items() if table != "incomplete" for v in section.values())
+            self.tasks.post(show_progress, locales.get_text("update_saved").format(lang=code, rows=rows))
 
         def task():
-            local_db = None
-            scraper = None
+            # 背景執行緒：不直接碰任何 Tk 元件；設定 POE_PROFILE 時整次更新存一份 cProfile
             try:
-                # 1. 先爬蟲 (還不要動資料庫)
-                scraper = PoeScraper(headless=True)
-                
-                lbl_loading.config(text="Scraping Ascendancy...")
-                asc_data = scraper.scrape_ascendancies()
-                
-                lbl_loading.config(text="Scraping Gems...")
-                gem_data = scraper.scrape_active_gems()
-                
-                # 2. 爬蟲成功後，才開啟資料庫連線
-                local_db = PoeDatabase() 
-                
-                # 【修正重點 2：清空舊資料】
-                lbl_loading.config(text="Clearing old data...")
-                local_db.clear_all_data() 
-                
-                # 3. 寫入新資料
-                lbl_loading.config(text="Saving new data...")
-                local_db.save_ascendancies(asc_data)
-                local_db.save_gems(gem_data)
-                
-                loading.destroy()
-                messagebox.showinfo("Success", locales.get_text("update_success"))
-                
-                # 4. 回主線程刷新介面
-                self.after(0, lambda: self.frames["AppPage"].refresh_tags())
-                
+                # 所有語言、所有頁面同時爬取，再各自差異同步 (每個語言一個交易)
+                with metrics.profile(metrics.profile_path()), metrics.timer("gui.update"):
+                    reports = update_locales(backend=self.scraper_backend, workers=self.scrape_workers,
+                                             cache=HttpCache(), on_page_done=on_page_done,
+                                             session=self.browser_session, on_saved=on_saved,
+                                             cancel_event=cancel_event)
+                self.tasks.post(finish, reports)
+            except UpdateCancelled:
+                self.tasks.post(cancelled)
             except Exception as e:
-                loading.destroy()
                 print(f"Update Error: {e}")
-                messagebox.showerror("Error", f"{locales.get_text('update_fail')}\n{e}")
-            finally:
-                if scraper: scraper.close()
-                if local_db: local_db.close()
+                self.tasks.post(failed, e)
 
         threading.Thread(target=task, daemon=True).start()
     
+    def refresh_app_tags(self):
+        """資料更新後刷新標籤 (AppPage 還沒建立就不用)"""
+        if "AppPage" in self.frames:
+            self.frames["AppPage"].refresh_tags()
+
     def on_closing(self):
-        self.db.close()
+        if self.browser_session:
+            self.browser_session.close()
+        # 抽籤 session 寫檔與關閉連線都在資料庫執行緒上做
+        self.db_executor.submit(self.flush_roll_sessions)
+        self.db_executor.submit(self.dbs.close)
+        self.db_executor.shutdown(wait=True)
         self.destroy()
 
 # ==============================
@@ -204,8 +476,11 @@ class AppPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
-        self.db = controller.db
         self.filter_rules = []
+        self.all_tags = []
+        # 搜尋：延遲查詢的 after id，以及目前最新一次搜尋的序號 (丟掉過時的結果)
+        self._search_job = None
+        self._search_seq = 0
         
         self.setup_ui()
     
@@ -228,6 +503,10 @@ class AppPage(tk.Frame):
                                       bg="#8e44ad", fg="white", font=("Arial", 10, "bold"))
         self.btn_roll_all.pack(side=tk.RIGHT)
 
+        # 重新開始不重複抽籤 (已經抽過的又可以被抽到)
+        self.btn_reset_session = tk.Button(header_frame, command=self.reset_session)
+        self.btn_reset_session.pack(side=tk.RIGHT, padx=5)
+
         # --- 昇華區 ---
         self.asc_frame = tk.LabelFrame(main_frame, padx=10, pady=10)
         self.asc_frame.pack(fill="x", pady=(0, 10))
@@ -248,6 +527,16 @@ class AppPage(tk.Frame):
         self.gem_frame = tk.LabelFrame(main_frame, padx=10, pady=10)
         self.gem_frame.pack(fill="both", expand=True)
 
+        # 搜尋 (輸入即搜尋)
+        f_search = tk.Frame(self.gem_frame)
+        f_search.pack(fill="x", pady=(0, 5))
+        self.lbl_search = tk.Label(f_search)
+        self.lbl_search.pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_changed)
+        self.search_entry = tk.Entry(f_search, textvariable=self.search_var, width=30)
+        self.search_entry.pack(side=tk.LEFT, padx=5)
+
         # 篩選
         f2 = tk.Frame(self.gem_frame)
         f2.pack(fill="x", pady=5)
@@ -276,18 +565,40 @@ class AppPage(tk.Frame):
         f3.pack(fill="x")
         self.lbl_gem_count = tk.Label(f3)
         self.lbl_gem_count.pack(side=tk.LEFT)
-        self.gem_spin = tk.Spinbox(f3, from_=1, to=20, width=5)
+        self.gem_spin = tk.Spinbox(f3, from_=1, to=MAX_GEM_ROLL, width=6)
         self.gem_spin.pack(side=tk.LEFT, padx=5)
         self.btn_gem_roll = tk.Button(f3, command=self.roll_gem, bg="#5bc0de", fg="white", font=("Arial", 11, "bold"))
         self.btn_gem_roll.pack(side=tk.LEFT, padx=10)
-
-        # 結果表
-        self.gem_tree = ttk.Treeview(self.gem_frame, columns=("Name", "Tags", "Link"), show="headings")
+        # 列出所有符合條件的技能 (不抽籤)
+        self.btn_show_all = tk.Button(f3, command=self.show_all_gems)
+        self.btn_show_all.pack(side=tk.LEFT)
+
+        # 分頁控制 (靠右)
+        self.btn_next_page = tk.Button(f3, text="▶", width=3)
+        self.btn_next_page.pack(side=tk.RIGHT)
+        self.lbl_page = tk.Label(f3, width=16)
+        self.lbl_page.pack(side=tk.RIGHT)
+        self.btn_prev_page = tk.Button(f3, text="◀", width=3)
+        self.btn_prev_page.pack(side=tk.RIGHT)
+
+        # 結果表 (加上捲軸，內容由 ResultView 分頁 / 分批填入)
+        tree_frame = tk.Frame(self.gem_frame)
+        tree_frame.pack(fill="both", expand=True)
+        self.gem_tree = ttk.Treeview(tree_frame, columns=("Name", "Tags", "Link"), show="headings")
         self.gem_tree.column("Name", width=150, anchor="center")
         self.gem_tree.column("Tags", width=400, anchor="w")
         self.gem_tree.column("Link", width=0, stretch=False)
         self.gem_tree.bind("<Double-1>", self.on_gem_double_click)
-        self.gem_tree.pack(fill="both", expand=True)
+        gem_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=self.gem_tree.yview)
+        self.gem_tree.configure(yscrollcommand=gem_scroll.set)
+        gem_scroll.pack(side=tk.RIGHT, fill="y")
+        self.gem_tree.pack(side=tk.LEFT, fill="both", expand=True)
+
+        self.gem_view = ResultView(self.gem_tree, {"Name": "name", "Tags": "tags", "Link": "link"},
+                                   on_page=self.update_page_label)
+        self.btn_prev_page.config(command=self.gem_view.prev_page)
+        self.btn_next_page.config(command=self.gem_view.next_page)
+        self.update_page_label(1, 1, 0)
 
         self.lbl_status = tk.Label(self, bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.lbl_status.pack(side=tk.BOTTOM, fill=tk.X)
@@ -295,9 +606,12 @@ class AppPage(tk.Frame):
         self.refresh_tags()
 
     def refresh_tags(self):
-        raw_tags = self.db.get_all_tags()
-        self.all_tags = sorted(raw_tags) if raw_tags else []
-        self.tag_combo['values'] = self.all_tags
+        self.controller.run_db(lambda db: db.get_tag_counts(), self.show_tags, name="refresh_tags")
+
+    def show_tags(self, tag_counts):
+        # 下拉選單顯示「標籤 (寶石數)」，self.all_tags 保留純標籤名稱
+        self.all_tags = [name for name, _ in tag_counts]
+        self.tag_combo['values'] = [f"{name} ({count})" for name, count in tag_counts]
         if self.all_tags:
             self.tag_combo.current(0)
 
@@ -313,6 +627,7 @@ class AppPage(tk.Frame):
         self.btn_asc_roll.config(text=locales.get_text("btn_roll_asc"))
         
         self.gem_frame.config(text=locales.get_text("lbl_gem_title"))
+        self.lbl_search.config(text=locales.get_text("lbl_search"))
         self.lbl_gem_filter.config(text=locales.get_text("lbl_filter"))
         self.btn_inc.config(text=locales.get_text("btn_include"))
         self.btn_exc.config(text=locales.get_text("btn_exclude"))
@@ -323,6 +638,9 @@ class AppPage(tk.Frame):
         
         self.lbl_gem_count.config(text=locales.get_text("lbl_count"))
         self.btn_gem_roll.config(text=locales.get_text("btn_roll_gem"))
+        self.btn_reset_session.config(text=locales.get_text("btn_reset_session"))
+        self.btn_show_all.config(text=locales.get_text("btn_show_all"))
+        self.update_page_label(self.gem_view.page + 1, self.gem_view.pages, len(self.gem_view.rows))
         
         self.gem_tree.heading("Name", text=locales.get_text("col_gem_name"))
         self.gem_tree.heading("Tags", text=locales.get_text("col_gem_tags"))
@@ -334,25 +652,38 @@ class AppPage(tk.Frame):
     
     # 【修改重點 3：新增一鍵抽取邏輯】
     def roll_all(self):
-        """同時執行昇華抽取與技能抽取"""
-        self.roll_ascendancy()
-        self.roll_gem()
-        # 更新狀態列，顯示綜合訊息
-        asc_text = self.asc_result.get("1.0", "end-1c")
-        if " / " in asc_text:
-            asc_count = len(asc_text.split(" / "))
-        else:
-            asc_count = 1 if asc_text and asc_text != locales.get_text("msg_no_data") else 0
-            
-        gem_count = len(self.gem_tree.get_children())
-        
-        if asc_count > 0 or gem_count > 0:
-            self.lbl_status.config(text=f"Combo Rolled! Ascendancy: {asc_count}, Gems: {gem_count}")
-        else:
-            self.lbl_status.config(text=locales.get_text("msg_no_data"))
+        """同時執行昇華抽取與技能抽取 (一次背景查詢)"""
+        asc_count = int(self.asc_spin.get())
+        gem_count = int(self.gem_spin.get())
+        includes, excludes = self.get_filter_tags()
+
+        def query(db):
+            # 透過 session 抽：整個候選池抽完之前不會重複
+            session = self.controller.roll_session(db)
+            return (session.draw_ascendancies(db, asc_count),
+                    session.draw_gems(db, includes, excludes, gem_count))
+
+        def done(result):
+            ascs, gems = result
+            self.show_ascendancies(ascs)
+            self.show_gems(gems)
+            # 更新狀態列，顯示綜合訊息
+            if ascs or gems:
+                self.lbl_status.config(text=f"Combo Rolled! Ascendancy: {len(ascs)}, Gems: {len(gems)}")
+            else:
+                self.lbl_status.config(text=locales.get_text("msg_no_data"))
+
+        self.controller.run_db(query, done, name="roll_all")
+
+    def get_filter_tags(self):
+        """回傳 (包含標籤, 排除標籤)"""
+        includes = [r['tag'] for r in self.filter_rules if r['type'] == 'include']
+        excludes = [r['tag'] for r in self.filter_rules if r['type'] == 'exclude']
+        return includes, excludes
 
     def add_filter(self, f_type):
-        tag = self.tag_combo.get()
+        idx = self.tag_combo.current()
+        tag = self.all_tags[idx] if idx >= 0 else ""
         if tag and not any(r['tag'] == tag for r in self.filter_rules):
             self.filter_rules.append({'tag': tag, 'type': f_type})
             self.update_rule_list()
@@ -377,7 +708,10 @@ class AppPage(tk.Frame):
 
     def roll_ascendancy(self):
         count = int(self.asc_spin.get())
-        results = self.db.get_random_ascendancies(count)
+        self.controller.run_db(lambda db: self.controller.roll_session(db).draw_ascendancies(db, count),
+                               self.show_ascendancies, name="roll_ascendancy")
+
+    def show_ascendancies(self, results):
         self.asc_result.config(state="normal")
         self.asc_result.delete("1.0", tk.END)
         self.asc_result.insert("1.0", " / ".join(results) if results else locales.get_text("msg_no_data"))
@@ -385,17 +719,60 @@ class AppPage(tk.Frame):
 
     def roll_gem(self):
         count = int(self.gem_spin.get())
-        includes = [r['tag'] for r in self.filter_rules if r['type'] == 'include']
-        excludes = [r['tag'] for r in self.filter_rules if r['type'] == 'exclude']
-        
-        gems = self.db.get_random_gems(includes, excludes, count)
-        
-        for item in self.gem_tree.get_children():
-            self.gem_tree.delete(item)
-            
+        includes, excludes = self.get_filter_tags()
+        self.controller.run_db(lambda db: self.controller.roll_session(db).draw_gems(db, includes, excludes, count),
+                               self.show_gems, name="roll_gem")
+
+    def reset_session(self):
+        """清掉目前語言的抽籤紀錄"""
+        self.controller.run_db(lambda db: self.controller.roll_session(db).reset(),
+                               lambda _: self.lbl_status.config(text=locales.get_text("msg_session_reset")))
+
+    def show_all_gems(self):
+        """列出所有符合目前標籤條件的技能"""
+        includes, excludes = self.get_filter_tags()
+
+        def query(db):
+            return db.get_gems_by_ids(db.get_gem_pool(includes, excludes))
+
+        def done(gems):
+            self.gem_view.set_rows(gems)
+            if gems:
+                self.lbl_status.config(text=locales.get_text("msg_show_all").format(count=len(gems)))
+            else:
+                self.lbl_status.config(text=locales.get_text("msg_roll_fail"))
+
+        self.controller.run_db(query, done, name="show_all")
+
+    def on_search_changed(self, *args):
+        """每次按鍵都重設計時器，停下來 SEARCH_DELAY 毫秒後才查詢"""
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DELAY, self.run_search)
+
+    def run_search(self):
+        self._search_job = None
+        text = self.search_var.get().strip()
+        if not text:
+            return
+        self._search_seq += 1
+        seq = self._search_seq
+
+        def done(gems):
+            # 查詢期間又打了字，這份結果已經過時
+            if seq != self._search_seq:
+                return
+            self.gem_view.set_rows(gems)
+            self.lbl_status.config(text=locales.get_text("msg_search_result").format(count=len(gems), text=text))
+
+        self.controller.run_db(lambda db: db.search_gems(text, SEARCH_LIMIT), done, name="search")
+
+    def update_page_label(self, page, pages, total):
+        self.lbl_page.config(text=locales.get_text("lbl_page").format(page=page, pages=pages, total=total))
+
+    def show_gems(self, gems):
+        self.gem_view.set_rows(gems)
         if gems:
-            for gem in gems:
-                self.gem_tree.insert("", "end", values=(gem['name'], gem['tags'], gem['link']))
             self.lbl_status.config(text=locales.get_text("msg_roll_success").format(count=len(gems)))
         else:
             self.lbl_status.config(text=locales.get_text("msg_roll_fail"))
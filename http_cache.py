@@ -0,0 +1,145 @@
+# http_cache.py
+# 爬蟲用的磁碟快取：內容以 sha256 定址存放，索引以 (語言, 網址) 為 key，
+# 支援 TTL、ETag / Last-Modified 條件式請求，以及離線「只重播快取」模式
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import metrics
+
+class CacheMiss(Exception):
+    """離線模式下快取裡沒有這個網址"""
+
+class HttpCache:
+    def __init__(self, cache_dir="http_cache", ttl=0, offline=False):
+        """
+        ttl：快取在幾秒內直接使用、不發請求 (0 = 每次都做條件式請求)
+        offline：完全不連網，只用快取 (沒有快取就丟 CacheMiss)
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "index"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "bodies"), exist_ok=True)
+        # 舊版留下、已經沒有索引指向的內容檔
+        self.prune()
+
+    def _index_path(self, url, lang_code):
+        key = hashlib.sha1(f"{lang_code}|{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "index", f"{key}.json")
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.cache_dir, "bodies", f"{body_hash}.html.gz")
+
+    def _write_atomic(self, path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_index(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load_entry(self, url, lang_code):
+        entry = self._read_index(self._index_path(url, lang_code))
+        # 內容檔不見了就當作沒有快取
+        return entry if entry and os.path.exists(self._body_path(entry["body_hash"])) else None
+
+    def _save_entry(self, url, lang_code, entry, body=None):
+        """
+        寫入索引 (body 有給時先寫內容檔)。這個網址原本指向的內容換掉了，
+        而且沒有其他索引用到時，刪掉舊的內容檔 (不然每次內容有變都會多留一份)
+        """
+        path = self._index_path(url, lang_code)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            if body is not None and not os.path.exists(self._body_path(entry["body_hash"])):
+                self._write_atomic(self._body_path(entry["body_hash"]), gzip.compress(body))
+            old = self._read_index(path)
+            self._write_atomic(path, data)
+            if old and old.get("body_hash") != entry["body_hash"] \
+                    and old.get("body_hash") not in self._referenced_hashes():
+                self._remove_body(old["body_hash"])
+
+    def _referenced_hashes(self):
+        """所有索引指向的內容雜湊"""
+        index_dir = os.path.join(self.cache_dir, "index")
+        hashes = set()
+        for name in os.listdir(index_dir):
+            if name.endswith(".json"):
+                entry = self._read_index(os.path.join(index_dir, name))
+                if entry:
+                    hashes.add(entry.get("body_hash"))
+        return hashes
+
+    def _remove_body(self, body_hash):
+        try:
+            os.remove(self._body_path(body_hash))
+            metrics.count("http_cache.pruned")
+        except OSError:
+            pass
+
+    def prune(self):
+        """刪掉沒有任何索引指向的內容檔，回傳刪掉幾個"""
+        suffix = ".html.gz"
+        with self._lock:
+            referenced = self._referenced_hashes()
+            orphans = [name[:-len(suffix)] for name in os.listdir(os.path.join(self.cache_dir, "bodies"))
+                       if name.endswith(suffix) and name[:-len(suffix)] not in referenced]
+            for body_hash in orphans:
+                self._remove_body(body_hash)
+        return len(orphans)
+
+    def _read_body(self, body_hash):
+        with gzip.open(self._body_path(body_hash), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def fetch(self, session, url, lang_code="", timeout=10):
+        """
+        透過快取取得頁面，回傳 (html, body_hash)
+        """
+        entry = self._load_entry(url, lang_code)
+        if entry and (self.offline or time.time() - entry["fetched_at"] < self.ttl):
+            metrics.count("http_cache.fresh")
+            return self._read_body(entry["body_hash"]), entry["body_hash"]
+        if self.offline:
+            metrics.count("http_cache.offline_miss")
+            raise CacheMiss(f"Not cached: {url}")
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        # poedb 端的時間 (含網路)
+        with metrics.timer("http_cache.request"):
+            resp = session.get(url, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and entry:
+            metrics.count("http_cache.not_modified")
+            entry["fetched_at"] = time.time()
+            self._save_entry(url, lang_code, entry)
+            return self._read_body(entry["body_hash"]), entry["body_hash"]
+        resp.raise_for_status()
+
+        metrics.count("http_cache.downloaded")
+        html = resp.text
+        body = html.encode("utf-8")
+        body_hash = hashlib.sha256(body).hexdigest()
+        self._save_entry(url, lang_code, {
+            "url": url,
+            "lang_code": lang_code,
+            "body_hash": body_hash,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }, body)
+        return html, body_hash
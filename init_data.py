@@ -1,38 +1,256 @@
 # init_data.py
-from scraper import PoeScraper
-from database import PoeDatabase
+import argparse
+from collections import namedtuple
+from scraper import scrape_locales, set_base_url, BrowserSession, UpdateCancelled, BACKENDS
+from database import PoeDatabase, locale_db_name
+from enricher import enrich_gems
+from http_cache import HttpCache
+from snapshot import export_snapshot, snapshot_path
+import locales
+import metrics
 
-def main():
-    print("=== 開始資料更新流程 ===")
-    
-    # Initialize Database
-    db = PoeDatabase()
-    
-    # Start Scraping
-    scraper = PoeScraper(headless=True)
-    
+# 串流寫入時每批幾列 (一批一個交易，斷點也以批為單位前進)
+INGEST_BATCH = 200
+# 變更報告每一類最多列出幾個名稱，其餘只顯示數量 (第一次同步時會有上千筆)
+REPORT_NAME_LIMIT = 20
+# 各頁面的中文名稱 (顯示警告用)
+PAGE_LABELS = {"ascendancies": "昇華職業", "gems": "技能寶石", "supports": "輔助寶石"}
+
+# ingest_page 的結果：rows = 已暫存的筆數，complete = 整頁都寫完了 (False = 中途出錯，下次從斷點接著寫)
+PageProgress = namedtuple("PageProgress", "rows complete")
+
+def print_sync_report(report, limit=REPORT_NAME_LIMIT):
+    """列出這次更新的變更 (以及沒抓完、下次接著做的頁面)，每一類最多列 limit 個名稱"""
+    for table, changes in report.items():
+        if table == "incomplete":
+            if changes:
+                print(f"[incomplete] {', '.join(changes)} (will resume next update)")
+            continue
+        summary = ", ".join(f"{kind} {len(names)}" for kind, names in changes.items())
+        print(f"[{table}] {summary}")
+        for kind, names in changes.items():
+            for name in names[:limit]:
+                print(f"  {kind}: {name}")
+            if len(names) > limit:
+                print(f"  {kind}: ... and {len(names) - limit} more")
+
+def load_page_hashes(lang_codes):
+    """各語言資料庫記錄的頁面內容雜湊 {lang_code: {頁面: 雜湊}}"""
+    known = {}
+    for lang_code in lang_codes:
+        db = PoeDatabase(locale_db_name(lang_code))
+        try:
+            known[lang_code] = db.get_page_hashes()
+        finally:
+            db.close()
+    return known
+
+def load_staged_pages(lang_codes):
+    """上次更新中斷前已經完整暫存、還沒同步的頁面 {lang_code: {頁面: PageProgress}}"""
+    staged = {}
+    for lang_code in lang_codes:
+        db = PoeDatabase(locale_db_name(lang_code))
+        try:
+            staged[lang_code] = {page: PageProgress(rows, True) for page, rows in db.get_staged_pages().items()}
+        finally:
+            db.close()
+    return staged
+
+def ingest_page(lang_code, page, open_rows, batch_size=INGEST_BATCH, cancel_event=None):
+    """
+    scrape_locales 的 sink (在 worker thread 裡執行)：open_rows() 開啟頁面，
+    再把逐列產生的資料每 batch_size 列寫進該語言資料庫的暫存區。
+    回傳 PageProgress(已暫存筆數, 是否完整)；頁面沒變時回傳 None。
+    同一份頁面內容 (內容雜湊相同) 上次寫到一半時，斷點之前的列直接略過。
+    整頁寫完後記下的是 rows 讀完時的雜湊 (改用 Selenium 重抓的頁面不會記成被擋的 HTTP 內容)。
+    開頁失敗或中途出錯時已寫入的批次與斷點都保留，complete 為 False，這頁這次不同步，下次更新從斷點接著寫。
+    """
+    try:
+        rows, page_hash = open_rows()
+    except Exception as e:
+        print(f"[{lang_code}] {page}: failed to open page ({e}), will retry next update")
+        metrics.count("update.ingest_errors")
+        return PageProgress(0, False)
+    if rows is None:
+        return None
+    db = PoeDatabase(locale_db_name(lang_code))
     try:
-        # Catch Ascendency
-        print("正在抓取昇華職業...")
-        ascendancies = scraper.scrape_ascendancies()
-        if ascendancies:
-            db.save_ascendancies(ascendancies)
-        else:
-            print("警告：沒有抓到昇華職業資料。")
-
-        # Catch Skill Gems and Tags
-        print("正在抓取技能寶石 (這需要一點時間)...")
-        gems = scraper.scrape_active_gems()
-        if gems:
-            db.save_gems(gems)
-        else:
-            print("警告：沒有抓到技能寶石資料。")
-            
+        start_row = db.start_ingest(page, page_hash())
+        if start_row:
+            print(f"[{lang_code}] {page}: resuming from row {start_row}")
+        batch = []
+        written = start_row
+
+        def flush():
+            nonlocal batch, written
+            if batch:
+                written = batch[-1][0] + 1
+                db.stage_rows(page, batch, written)
+                metrics.count("update.rows_staged", len(batch))
+                batch = []
+
+        try:
+            for row_no, row in enumerate(rows):
+                if row_no < start_row:
+                    continue
+                if page == "ascendancies":
+                    batch.append((row_no, row, None, None))
+                else:
+                    batch.append((row_no, row["name"], row["tags"], row["link"]))
+                if len(batch) >= batch_size:
+                    flush()
+                    if cancel_event and cancel_event.is_set():
+                        raise UpdateCancelled()
+            flush()
+        except UpdateCancelled:
+            flush()
+            raise
+        except Exception as e:
+            flush()
+            print(f"[{lang_code}] {page}: interrupted after {written} rows ({e}), will resume next update")
+            metrics.count("update.ingest_errors")
+            return PageProgress(written, False)
+        db.finish_ingest(page, page_hash())
+        return PageProgress(written, True)
     finally:
-        # Finish Messages
-        scraper.close()
         db.close()
-        print("=== 資料更新完成！請檢查 poe_builds.db 是否已建立 ===")
+
+def save_locale(lang_code, progress, enrich=False):
+    """
+    把單一語言已完整暫存的頁面同步到該語言的資料庫，回傳變更報告。
+    progress：各頁的 PageProgress (scrape_locales 串流模式的結果)，用來顯示警告；
+    沒完成的頁面列在報告的 "incomplete" 裡 (這次不同步，下次更新從斷點接著做)
+    """
+    db_name = locale_db_name(lang_code)
+    print(f"=== [{lang_code}] 寫入資料庫 ({db_name}) ===")
+    incomplete = []
+    for page, label in PAGE_LABELS.items():
+        result = progress.get(page)
+        # None = 頁面內容跟上次一樣，已略過解析
+        if result is None:
+            print(f"{label}頁面沒有變更，略過。")
+        elif not result.complete:
+            incomplete.append(page)
+            print(f"警告：{label}頁面沒有抓完 (已暫存 {result.rows} 筆)，這次不同步，下次更新會從斷點接著做。")
+        elif not result.rows:
+            print(f"警告：沒有抓到{label}資料。")
+
+    db = PoeDatabase(db_name)
+    try:
+        # 差異同步 (沒抓到、沒變或還沒暫存完的那一類資料不會被動到)
+        report = db.sync_staged()
+        report["incomplete"] = incomplete
+        print_sync_report(report)
+        if enrich:
+            # 只抓還沒有詳細資料 (新增或內容有變) 的寶石
+            print("正在補充寶石詳細資料...")
+            enrich_gems(db)
+    finally:
+        db.close()
+    return report
+
+def update_locales(lang_codes=None, backend="http", workers=4, cache=None, enrich=False, on_page_done=None,
+                   session=None, on_saved=None, cancel_event=None):
+    """
+    爬取並寫入多個語言 (預設全部)，回傳 {lang_code: 變更報告}
+    session：selenium 後端可傳入 BrowserSession 重複使用已開好的瀏覽器
+    on_saved(lang_code, report)：每個語言寫入完成時呼叫
+    cancel_event：設定後停止 (已寫入的語言保持完整，丟出 UpdateCancelled)
+    爬到的資料邊解析邊分批寫進各語言資料庫的暫存區 (見 ingest_page)，中斷或出錯後再更新一次會從斷點接著寫，
+    已經完整暫存的頁面也不會重抓；每個語言最後再從暫存區一次同步到正式資料表。
+    """
+    lang_codes = lang_codes or list(locales.TRANSLATIONS)
+    # 所有語言、所有頁面同時爬取；有快取時，內容沒變的頁面直接略過
+    known_hashes = load_page_hashes(lang_codes) if cache else None
+
+    def sink(lang_code, page, open_rows):
+        return ingest_page(lang_code, page, open_rows, cancel_event=cancel_event)
+
+    with metrics.timer("update.scrape"):
+        results = scrape_locales(lang_codes, backend, max_workers=workers, on_page_done=on_page_done,
+                                 cache=cache, known_hashes=known_hashes, session=session, cancel_event=cancel_event,
+                                 sink=sink, skip_pages=load_staged_pages(lang_codes))
+    reports = {}
+    for lang_code in lang_codes:
+        if cancel_event and cancel_event.is_set():
+            raise UpdateCancelled()
+        with metrics.timer("update.save"):
+            reports[lang_code] = save_locale(lang_code, results[lang_code], enrich)
+        if on_saved:
+            on_saved(lang_code, reports[lang_code])
+    return reports
+
+def export_snapshots(lang_codes=None):
+    """把各語言目前的資料庫匯出成快照 (poe_snapshot_{lang}.json.gz)，回傳 {lang_code: 摘要}"""
+    summaries = {}
+    for lang_code in lang_codes or list(locales.TRANSLATIONS):
+        db = PoeDatabase(locale_db_name(lang_code))
+        try:
+            path = snapshot_path(lang_code)
+            summaries[lang_code] = export_snapshot(db, path, lang_code)
+        finally:
+            db.close()
+        rows = summaries[lang_code]["rows"]
+        print(f"[{lang_code}] snapshot {path}: {rows['gems']} gems, {rows['supports']} supports, "
+              f"{rows['ascendancies']} ascendancies, {summaries[lang_code]['bytes']} bytes")
+    return summaries
+
+def print_page_done(lang_code, page, progress):
+    if progress is None:
+        print(f"[{lang_code}] {page}: 沒有變更")
+    elif not progress.complete:
+        print(f"[{lang_code}] {page}: 中斷於第 {progress.rows} 筆，下次更新會接著做")
+    else:
+        print(f"[{lang_code}] {page}: {progress.rows} 筆")
+
+def main(backend="http", langs=None, workers=4, enrich=False, cache=None, profile_path=None):
+    """profile_path：把整次更新的 cProfile 結果存到這個檔案 (預設看 POE_PROFILE 環境變數)"""
+    with metrics.profile(profile_path or metrics.profile_path()), metrics.timer("update.total"):
+        _run_update(backend, langs, workers, enrich, cache)
+
+def _run_update(backend, langs, workers, enrich, cache):
+    print("=== 開始資料更新流程 ===")
+    print("正在抓取昇華職業、技能寶石與輔助寶石 (這需要一點時間)...")
+    # selenium 後端：各語言、各頁面共用同一批瀏覽器
+    session = BrowserSession(headless=True) if backend == "selenium" else None
+    try:
+        update_locales(langs, backend, workers, cache, enrich, on_page_done=print_page_done, session=session)
+    finally:
+        if session:
+            session.close()
+    print("=== 資料更新完成！ ===")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="更新各語言的資料庫 (poe_builds_tw.db / poe_builds_us.db)")
+    parser.add_argument("--backend", choices=BACKENDS, default="http",
+                        help="http = 直接抓網頁 (較快，失敗時改用 Selenium)；selenium = 一律開 Chrome")
+    parser.add_argument("--lang", nargs="+", choices=list(locales.TRANSLATIONS), dest="langs",
+                        help="只更新指定語言 (預設全部)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="同時爬取的頁面數上限 (預設 4)")
+    parser.add_argument("--enrich", action="store_true",
+                        help="同時抓取每個寶石頁面，補充需求等級、顏色、魔力消耗與品質效果")
+    parser.add_argument("--cache-dir", default="http_cache", help="HTTP 快取資料夾 (http 後端)")
+    parser.add_argument("--cache-ttl", type=int, default=0,
+                        help="快取幾秒內直接使用不連網 (預設 0 = 每次做條件式請求)")
+    parser.add_argument("--offline", action="store_true", help="只重播快取，不連網")
+    parser.add_argument("--no-cache", action="store_true", help="不使用 HTTP 快取")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="收集各階段耗時 / 計數，結束時寫到 FILE (.json 或 .csv)，同 POE_METRICS 環境變數")
+    parser.add_argument("--profile", metavar="FILE", help="把這次更新的 cProfile 結果存到 FILE，同 POE_PROFILE 環境變數")
+    parser.add_argument("--base-url", help="poedb 網址 (預設 https://poedb.tw，同 POE_BASE_URL 環境變數)；"
+                                          "測試時可指向 poedb_stub.py 的本機伺服器")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="更新完後把各語言資料庫匯出成快照 (poe_snapshot_{lang}.json.gz，新安裝時直接載入)")
+    parser.add_argument("--snapshot-only", action="store_true", help="不更新，只用現有資料庫產生快照")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable(args.metrics)
+    if args.base_url:
+        set_base_url(args.base_url)
+    cache = None if args.no_cache else HttpCache(args.cache_dir, args.cache_ttl, args.offline)
+    if not args.snapshot_only:
+        main(args.backend, args.langs, args.workers, args.enrich, cache, args.profile)
+    if args.snapshot or args.snapshot_only:
+        export_snapshots(args.langs)
@@ -20,10 +20,19 @@ TRANSLATIONS = {
         
         # --- 更新視窗/狀態 ---
         "update_confirm_title": "確認更新",
-        "update_confirm_msg": "更新資料庫會開啟瀏覽器爬取資料，需要一點時間。\n(切換語言後建議重新更新一次以獲取對應語言的資料)\n\n要繼續嗎？",
+        "update_confirm_msg": "更新資料庫會爬取所有語言的資料，需要一點時間。\n(每個語言各有一份資料庫，之後切換語言不需要重新更新)\n\n要繼續嗎？",
         "update_running": "正在更新資料庫... 請稍候",
         "update_success": "資料庫更新完成！",
+        "update_summary": "寶石：新增 {gem_add}、更新 {gem_upd}、刪除 {gem_del}\n輔助：新增 {sup_add}、更新 {sup_upd}、刪除 {sup_del}\n昇華：新增 {asc_add}、刪除 {asc_del}",
         "update_fail": "更新失敗，請檢查網路或驅動程式。",
+        "update_cancelling": "正在取消... (等目前的頁面完成)",
+        "update_cancelled": "已取消更新，已完成的語言資料已保留。",
+        "update_page_done": "[{lang}] {page}：解析 {rows} 筆",
+        "update_page_unchanged": "[{lang}] {page}：沒有變更",
+        "update_page_incomplete": "[{lang}] {page}：中斷於第 {rows} 筆，下次更新會接著做",
+        "update_incomplete": "未完成 (下次更新接續)：{pages}",
+        "update_saved": "[{lang}] 已寫入 {rows} 筆變更",
+        "btn_cancel": "取消",
         
         # --- 主功能介面 ---
         "lbl_asc_title": "🛡️ 昇華職業抽選",
@@ -47,11 +56,19 @@ TRANSLATIONS = {
         "msg_ready": "準備就緒。",
         "msg_roll_success": "成功抽取 {count} 個技能。",
         "msg_roll_fail": "找不到符合條件的技能。",
+        "msg_show_all": "共有 {count} 個符合條件的技能。",
+        "btn_show_all": "📋 列出全部",
+        "lbl_search": "🔍 搜尋:",
+        "btn_reset_session": "🔄 重置抽籤紀錄",
+        "msg_session_reset": "已重置，所有昇華與技能都可以再次被抽到。",
+        "msg_search_result": "「{text}」找到 {count} 個技能。",
+        "lbl_page": "第 {page}/{pages} 頁 ({total})",
         
         # --- 爬蟲 Log (print用) ---
         "log_start_scrape": "開始爬取... 目標語言: Traditional Chinese",
         "log_asc_done": "昇華職業抓取完成。",
         "log_gem_done": "技能寶石抓取完成。",
+        "log_support_done": "輔助寶石抓取完成。",
     },
     "us": {
         # --- System ---
@@ -71,10 +88,19 @@ TRANSLATIONS = {
         
         # --- Update ---
         "update_confirm_title": "Confirm Update",
-        "update_confirm_msg": "Updating the database will open a browser to scrape data.\n(It is recommended to update data after switching languages.)\n\nContinue?",
+        "update_confirm_msg": "Updating the database will scrape data for every language.\n(Each language has its own database, so switching languages needs no re-update.)\n\nContinue?",
         "update_running": "Updating database... Please wait.",
         "update_success": "Database updated successfully!",
+        "update_summary": "Gems: +{gem_add} / ~{gem_upd} / -{gem_del}\nSupports: +{sup_add} / ~{sup_upd} / -{sup_del}\nAscendancies: +{asc_add} / -{asc_del}",
         "update_fail": "Update failed. Check network or driver.",
+        "update_cancelling": "Cancelling... (waiting for current pages)",
+        "update_cancelled": "Update cancelled. Languages already finished were kept.",
+        "update_page_done": "[{lang}] {page}: parsed {rows} rows",
+        "update_page_unchanged": "[{lang}] {page}: unchanged",
+        "update_page_incomplete": "[{lang}] {page}: interrupted after {rows} rows, will resume next update",
+        "update_incomplete": "Incomplete (will resume next update): {pages}",
+        "update_saved": "[{lang}] wrote {rows} changes",
+        "btn_cancel": "Cancel",
         
         # --- Main App ---
         "lbl_asc_title": "🛡️ Ascendancy",
@@ -98,20 +124,28 @@ TRANSLATIONS = {
         "msg_ready": "Ready.",
         "msg_roll_success": "Successfully rolled {count} gems.",
         "msg_roll_fail": "No matching gems found.",
+        "msg_show_all": "{count} gems match the filters.",
+        "btn_show_all": "📋 Show All",
+        "lbl_search": "🔍 Search:",
+        "btn_reset_session": "🔄 Reset Roll History",
+        "msg_session_reset": "Roll history cleared. Every ascendancy and gem can be rolled again.",
+        "msg_search_result": "{count} gems found for \"{text}\".",
+        "lbl_page": "Page {page}/{pages} ({total})",
         
         # --- Scraper Log ---
         "log_start_scrape": "Starting scraper... Target Language: English",
         "log_asc_done": "Ascendancies scraped.",
         "log_gem_done": "Skill gems scraped.",
+        "log_support_done": "Support gems scraped.",
     }
 }
 
 # 預設語言
 current_lang = "tw"
 
-def get_text(key):
-    """取得當前語言的字串"""
-    return TRANSLATIONS[current_lang].get(key, key)
+def get_text(key, lang=None):
+    """取得當前語言 (或指定語言) 的字串"""
+    return TRANSLATIONS[lang or current_lang].get(key, key)
 
 def set_lang(lang):
     """切換語言"""
@@ -0,0 +1,165 @@
+# metrics.py
+# 輕量的計時 / 計數工具：預設關閉 (幾乎零成本)，設定環境變數或 CLI 參數才收集
+#   POE_METRICS=metrics.json python init_data.py      (結束時寫 JSON，副檔名 .csv 則寫 CSV)
+#   POE_PROFILE=update.prof  python init_data.py      (整次更新的 cProfile 結果)
+import atexit
+import contextlib
+import cProfile
+import csv
+import functools
+import json
+import os
+import platform
+import threading
+import time
+
+METRICS_ENV = "POE_METRICS"
+PROFILE_ENV = "POE_PROFILE"
+
+_lock = threading.Lock()
+_timers = {}    # name -> [count, total, min, max]
+_counters = {}  # name -> int
+_report_path = None
+_enabled = False
+
+def enable(report_path=None):
+    """開始收集；有 report_path 時程式結束會自動寫出報告"""
+    global _enabled, _report_path
+    _enabled = True
+    if report_path and _report_path is None:
+        atexit.register(lambda: write_report(_report_path))
+    _report_path = report_path or _report_path
+
+def disable():
+    """停止收集 (已收集的結果保留，見 reset)"""
+    global _enabled
+    _enabled = False
+
+def enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+def record(name, seconds):
+    """記一筆耗時 (秒)"""
+    if not _enabled:
+        return
+    with _lock:
+        stat = _timers.get(name)
+        if stat is None:
+            _timers[name] = [1, seconds, seconds, seconds]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = min(stat[2], seconds)
+            stat[3] = max(stat[3], seconds)
+
+def count(name, n=1):
+    """計數器 +n"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+_NULL = contextlib.nullcontext()
+
+def timer(name):
+    """with metrics.timer("db.sync_data"): ...  (關閉時是空的 context manager)"""
+    return _Timer(name) if _enabled else _NULL
+
+def timed(name):
+    """裝飾器版的 timer"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """目前收集到的結果 (可直接 json.dump)"""
+    with _lock:
+        timers = {
+            name: {
+                "count": c,
+                "total_s": round(total, 6),
+                "mean_ms": round(total / c * 1000, 4),
+                "min_ms": round(lo * 1000, 4),
+                "max_ms": round(hi * 1000, 4),
+            }
+            for name, (c, total, lo, hi) in sorted(_timers.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pid": os.getpid(),
+        },
+        "timers": timers,
+        "counters": counters,
+    }
+
+def write_report(path):
+    """寫出報告：.csv 為 (kind, name, count, total_s, mean_ms, min_ms, max_ms)，其他副檔名為 JSON"""
+    if not path:
+        return
+    data = snapshot()
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "count", "total_s", "mean_ms", "min_ms", "max_ms"])
+            for name, t in data["timers"].items():
+                writer.writerow(["timer", name, t["count"], t["total_s"], t["mean_ms"], t["min_ms"], t["max_ms"]])
+            for name, value in data["counters"].items():
+                writer.writerow(["counter", name, value, "", "", "", ""])
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"[metrics] report written to {path}")
+
+@contextlib.contextmanager
+def profile(path):
+    """把區塊內的執行過程用 cProfile 記下來 (path 為 None 時不做事)；用 python -m pstats 查看"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"[metrics] profile written to {path}")
+
+def profile_path():
+    """POE_PROFILE 環境變數 (沒設定為 None)"""
+    return os.environ.get(PROFILE_ENV) or None
+
+# 有設定環境變數就在 import 時啟用
+if os.environ.get(METRICS_ENV):
+    enable(os.environ[METRICS_ENV])
@@ -0,0 +1,174 @@
+# poedb_stub.py
+# 本機的 poedb 替身伺服器：提供假的 (或事先錄下的) Ascendancy_class / Skill_Gems / Support_Gems 頁面，
+# 可以調整資料量與延遲，讓爬蟲流程不連網也能測試、量測
+#   python poedb_stub.py --gems 700 --latency 0.2 --port 8000
+#   python init_data.py --base-url http://127.0.0.1:8000 --no-cache
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 網址路徑 -> 頁面種類 (跟 scraper.PAGE_PATHS 對應)
+PAGE_KINDS = {
+    "Ascendancy_class": "ascendancies",
+    "Skill_Gems": "gems",
+    "Support_Gems": "supports",
+}
+
+def render_ascendancies(count):
+    """昇華職業頁面 (div.flex-grow-1 figcaption a)"""
+    figures = "".join(
+        f'<figure><img src="/image/asc_{i}.webp"><figcaption><a href="/asc_{i}">Ascendancy {i}</a></figcaption></figure>'
+        for i in range(count)
+    )
+    return f'<html><body><div class="d-flex"><div class="flex-grow-1">{figures}</div></div></body></html>'
+
+def render_gem_table(lang_code, count, prefix="Gem", first_tag=None, tags_per_gem=4, tag_pool=40, seed=0):
+    """寶石表格頁面 (table.filters tbody tr，第二欄是名稱連結與 .gem_tags)"""
+    rng = random.Random(f"{seed}|{prefix}")
+    pool = [f"Tag {i}" for i in range(tag_pool)]
+    per_gem = min(tags_per_gem, tag_pool)
+    rows = []
+    for i in range(count):
+        tags = rng.sample(pool, per_gem)
+        if first_tag:
+            tags.insert(0, first_tag)
+        name = f"{prefix} {i}"
+        rows.append(
+            f'<tr><td><img src="/image/{prefix}_{i}.webp"></td>'
+            f'<td><a href="/{lang_code}/{prefix}_{i}">{escape(name)}</a>'
+            f'<div class="gem_tags">{escape(", ".join(tags))}</div></td>'
+            f'<td>{rng.randint(1, 20)}</td></tr>'
+        )
+    return ('<html><body><table class="table filters"><thead><tr><th></th><th>Name</th><th>Level</th></tr></thead>'
+            f'<tbody>{"".join(rows)}</tbody></table></body></html>')
+
+class PoedbStub:
+    """
+    在背景執行緒跑的 HTTP 伺服器 (port=0 表示自動挑一個空的 port，見 base_url)
+    gems / supports / ascendancies：假資料的筆數；latency：每個請求先等幾秒再回應
+    pages_dir：有 {pages_dir}/{lang}/{Skill_Gems|...}.html 時改用錄下來的頁面
+    回應帶 ETag，可以測 HttpCache 的條件式請求 (304)
+    """
+    def __init__(self, gems=700, supports=300, ascendancies=19, latency=0.0, pages_dir=None,
+                 host="127.0.0.1", port=0, seed=0):
+        self.gems = gems
+        self.supports = supports
+        self.ascendancies = ascendancies
+        self.latency = latency
+        self.pages_dir = pages_dir
+        self.seed = seed
+        self.requests = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page(self, lang_code, path):
+        """(內容, ETag)；不認得的頁面回傳 None。每個頁面只產生一次"""
+        key = (lang_code, path)
+        with self._lock:
+            if key not in self._pages:
+                html = self._load(lang_code, path)
+                if html is None:
+                    return None
+                body = html.encode("utf-8")
+                self._pages[key] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+            return self._pages[key]
+
+    def _load(self, lang_code, path):
+        if self.pages_dir:
+            recorded = os.path.join(self.pages_dir, lang_code, f"{path}.html")
+            if os.path.exists(recorded):
+                with open(recorded, "r", encoding="utf-8") as f:
+                    return f.read()
+        kind = PAGE_KINDS.get(path)
+        if kind == "ascendancies":
+            return render_ascendancies(self.ascendancies)
+        if kind == "gems":
+            return render_gem_table(lang_code, self.gems, "Gem", seed=self.seed)
+        if kind == "supports":
+            return render_gem_table(lang_code, self.supports, "Support", "Support", tags_per_gem=2, seed=self.seed)
+        return None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                parts = self.path.split("?")[0].strip("/").split("/")
+                found = stub.page(parts[0], parts[1]) if len(parts) == 2 else None
+                if found is None:
+                    self.send_error(404)
+                    return
+                body, etag = found
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不要每個請求都印一行
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="poedb-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機的 poedb 替身伺服器 (給爬蟲測試 / 效能測試用)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--gems", type=int, default=700, help="技能寶石頁面的列數")
+    parser.add_argument("--supports", type=int, default=300, help="輔助寶石頁面的列數")
+    parser.add_argument("--ascendancies", type=int, default=19)
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求延遲幾秒")
+    parser.add_argument("--pages-dir", help="錄下來的頁面資料夾 ({lang}/Skill_Gems.html 等)，有的話優先使用")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = PoedbStub(args.gems, args.supports, args.ascendancies, args.latency, args.pages_dir,
+                     args.host, args.port, args.seed)
+    print(f"poedb stub listening on {stub.base_url} (Ctrl+C to stop)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
@@ -0,0 +1,162 @@
+# roll_session.py
+# 不重複抽籤 session：每組篩選條件各自保留一個「惰性洗牌」的排列與游標，
+# 抽完整個候選池之前不會重複；狀態存成 JSON，重開程式也接得上，資料版本變了就重建
+import json
+import os
+import random
+import threading
+
+SESSION_FILE_TEMPLATE = "roll_session_{name}.json"
+
+def session_path(db_name):
+    """資料庫檔對應的 session 檔 (poe_builds_tw.db -> roll_session_poe_builds_tw.json)"""
+    return SESSION_FILE_TEMPLATE.format(name=os.path.splitext(os.path.basename(db_name))[0])
+
+def _pool_key(kind, include_tags=None, exclude_tags=None):
+    """篩選條件轉成固定的字串 key (標籤順序不影響)"""
+    return "|".join([kind, ",".join(sorted(include_tags or ())), ",".join(sorted(exclude_tags or ()))])
+
+class RollSession:
+    """
+    每個候選池是一個稀疏 Fisher–Yates 排列：只記錄被交換過的位置 (swapped) 與游標 (cursor)，
+    每抽一個 O(1)，不用先把整個池子洗好；抽完一輪 (cycle) 才重新開始。
+    只在單一執行緒使用 (GUI 裡是資料庫執行緒)。
+    autosave=True 每抽一次就整個寫檔；連續抽很多次的場合 (GUI) 用 autosave=False，
+    在關閉視窗等時機呼叫 flush() 一次寫入。
+    """
+    def __init__(self, path=None, seed=None, autosave=True):
+        self.path = path
+        self.autosave = autosave
+        # 有還沒寫進檔案的變動 (見 flush)
+        self.dirty = False
+        self.rng = random.Random(seed)
+        self.db_name = None
+        self.data_version = None
+        self.pools = {}
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def load(self):
+        """讀取 session 檔 (壞掉或不存在就當成新的)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.db_name = state.get("db_name")
+        self.data_version = state.get("data_version")
+        self.pools = {
+            key: {"n": p["n"], "cursor": p["cursor"], "cycle": p.get("cycle", 0),
+                  "swapped": {int(k): v for k, v in p["swapped"].items()}}
+            for key, p in state.get("pools", {}).items()
+        }
+        rng_state = state.get("rng")
+        if rng_state:
+            self.rng.setstate((rng_state[0], tuple(rng_state[1]), rng_state[2]))
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            "db_name": self.db_name,
+            "data_version": self.data_version,
+            "rng": list(self.rng.getstate()),
+            "pools": self.pools,
+        }
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        self.dirty = False
+
+    def flush(self):
+        """有還沒存的變動才寫檔"""
+        if self.dirty:
+            self.save()
+
+    def _changed(self):
+        self.dirty = True
+        if self.autosave:
+            self.save()
+
+    def reset(self):
+        """清掉所有排列 (下一次抽籤重新開始)，清完的狀態很小，直接寫檔"""
+        self.pools = {}
+        self.save()
+
+    def _check_version(self, db):
+        """換了資料庫或資料版本變了，舊的排列全部作廢"""
+        version = db.get_data_version()
+        if self.db_name != db.db_name or self.data_version != version:
+            self.db_name = db.db_name
+            self.data_version = version
+            self.pools = {}
+            self.dirty = True
+
+    def _state(self, key, n):
+        state = self.pools.get(key)
+        if state is None or state["n"] != n:
+            state = self.pools[key] = {"n": n, "cursor": 0, "cycle": 0, "swapped": {}}
+        return state
+
+    def _next(self, state, hi):
+        """從位置 [cursor, hi) 抽一個，換到 cursor 並前進 (稀疏 Fisher–Yates 的一步)"""
+        swapped = state["swapped"]
+        i = state["cursor"]
+        j = self.rng.randrange(i, hi)
+        value = swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+        swapped.pop(i, None)  # cursor 之前的位置不會再用到，不用留著
+        state["cursor"] = i + 1
+        return value
+
+    def _new_cycle(self, state, taken):
+        """
+        重新開始一輪。taken 是這次已經從上一輪抽到的索引，先移到排列最後面，
+        回傳這次可抽的上限 hi (同一次抽籤內不會跟 taken 重複，也不用重抽)
+        """
+        n = state["n"]
+        state["cursor"] = 0
+        state["cycle"] += 1
+        swapped = state["swapped"] = {}
+        where = {}
+        for k, value in enumerate(taken):
+            target = n - 1 - k
+            pos = where.get(value, value)
+            moved = swapped.get(target, target)
+            swapped[pos] = moved
+            where[moved] = pos
+            swapped[target] = value
+            where[value] = target
+        return n - len(taken)
+
+    def _draw(self, key, pool, count):
+        state = self._state(key, len(pool))
+        count = min(count, state["n"])
+        picked = []
+        hi = state["n"]
+        while len(picked) < count:
+            if state["cursor"] >= hi:
+                hi = self._new_cycle(state, picked)
+            picked.append(self._next(state, hi))
+        self._changed()
+        return [pool[i] for i in picked]
+
+    def remaining(self, key):
+        """這一輪還剩幾個沒抽過"""
+        state = self.pools.get(key)
+        return None if state is None else state["n"] - state["cursor"]
+
+    def draw_ascendancies(self, db, count=1):
+        """不重複抽昇華職業 (名稱 list)"""
+        self._check_version(db)
+        return self._draw(_pool_key("ascendancies"), db.get_ascendancy_pool(), count)
+
+    def draw_gems(self, db, include_tags=None, exclude_tags=None, count=1):
+        """不重複抽寶石 [{name, tags, link}]，每組篩選條件各自一個排列"""
+        self._check_version(db)
+        pool = db.get_gem_pool(include_tags, exclude_tags)
+        return db.get_gems_by_ids(self._draw(_pool_key("gems", include_tags, exclude_tags), pool, count))
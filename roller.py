@@ -0,0 +1,208 @@
+# roller.py
+# 命令列抽籤 (不需要 Tkinter / Selenium)，結果以 JSONL 或 CSV 串流輸出到 stdout
+#   python roller.py -n 1000 --include Spell --exclude Totem --gems 3 --seed 42
+#   python roller.py -n 100 --weights popularity.csv --tag-weight Minion=0.2 --decay 0.5
+#   python roller.py -n 10000 --builds --include Spell --format csv   (昇華 + 主技能 + 5 輔助)
+#   python roller.py -n 300 --session event.json   (活動用：跨多次執行都不重複，抽完一輪才重來)
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+from builds import generate_builds, SUPPORT_COUNT
+from database import PoeDatabase, locale_db_name
+from roll_session import RollSession
+from sampler import Sampler
+from snapshot import seed_database
+import locales
+
+def generate_combos(db, count, asc_count=1, gem_count=1, include_tags=None, exclude_tags=None, seed=None,
+                    weighted=False, decay=None, session=None):
+    """
+    產生 count 組 (昇華, 寶石) 組合的 generator。
+    候選池與寶石資料只在開始時讀一次，之後每組都是純記憶體抽樣。
+    weighted：依 db.weights / db.tag_weights 加權 (alias table)；
+    decay：每組抽完後把抽到的項目權重乘上這個值 (只會增量重建權重表)
+    session：RollSession，改用不重複抽籤 (候選池抽完一輪之前不會重複)
+    """
+    if session is not None:
+        for i in range(count):
+            yield {
+                "roll": i + 1,
+                "ascendancies": session.draw_ascendancies(db, asc_count),
+                "gems": session.draw_gems(db, include_tags, exclude_tags, gem_count),
+            }
+        return
+
+    sampler = Sampler(seed)
+    if not weighted:
+        asc_pool = db.get_ascendancy_pool()
+        gem_ids = db.get_gem_pool(include_tags, exclude_tags)
+        gem_pool = db.get_gems_by_ids(gem_ids)
+
+        for i in range(count):
+            yield {
+                "roll": i + 1,
+                "ascendancies": sampler.sample(asc_pool, asc_count),
+                "gems": sampler.sample(gem_pool, gem_count),
+            }
+        return
+
+    asc_entry = db.get_weighted_ascendancy_pool()
+    gem_entry = db.get_weighted_gem_pool(include_tags, exclude_tags)
+    for i in range(count):
+        ascs = sampler.weighted_sample(asc_entry["items"], asc_entry["table"], asc_count)
+        gems = sampler.weighted_sample(gem_entry["items"], gem_entry["table"], gem_count)
+        if decay is not None:
+            db.decay_weights(ascs + [g["name"] for g in gems], decay)
+        yield {"roll": i + 1, "ascendancies": ascs, "gems": gems}
+
+def write_jsonl(combos, out, batch_size=1000):
+    """
+    每組一行 JSON。候選池裡的項目是同一批物件，編碼一次就重複使用，並整批寫出
+    """
+    encoded = {}
+
+    def encode(item):
+        key = id(item)
+        if key not in encoded:
+            encoded[key] = (item, json.dumps(item, ensure_ascii=False))
+        return encoded[key][1]
+
+    lines = []
+    for combo in combos:
+        lines.append('{"roll": %d, "ascendancies": [%s], "gems": [%s]}\n' % (
+            combo["roll"],
+            ", ".join(encode(a) for a in combo["ascendancies"]),
+            ", ".join(encode(g) for g in combo["gems"]),
+        ))
+        if len(lines) >= batch_size:
+            out.write("".join(lines))
+            lines = []
+    out.write("".join(lines))
+
+def write_builds_jsonl(builds, out, batch_size=1000):
+    """完整流派，每組一行 JSON (寶石只輸出名稱與連結)"""
+    encoded = {}
+
+    def encode(gem):
+        key = id(gem)
+        if key not in encoded:
+            encoded[key] = (gem, json.dumps({"name": gem["name"], "link": gem["link"]}, ensure_ascii=False))
+        return encoded[key][1]
+
+    lines = []
+    for build in builds:
+        lines.append('{"roll": %d, "ascendancy": %s, "skill": %s, "supports": [%s]}\n' % (
+            build["roll"],
+            json.dumps(build["ascendancy"], ensure_ascii=False),
+            encode(build["skill"]),
+            ", ".join(encode(g) for g in build["supports"]),
+        ))
+        if len(lines) >= batch_size:
+            out.write("".join(lines))
+            lines = []
+    out.write("".join(lines))
+
+def write_builds_csv(builds, out, support_count):
+    """每組一列：roll, ascendancy, skill, support_1..n"""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["roll", "ascendancy", "skill"] + [f"support_{i + 1}" for i in range(support_count)])
+    for build in builds:
+        writer.writerow([build["roll"], build["ascendancy"], build["skill"]["name"]]
+                        + [g["name"] for g in build["supports"]])
+
+def write_csv(combos, out, asc_count, gem_count):
+    """每組一列：roll, ascendancy_1..n, gem_1..m"""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["roll"]
+                    + [f"ascendancy_{i + 1}" for i in range(asc_count)]
+                    + [f"gem_{i + 1}" for i in range(gem_count)])
+    for combo in combos:
+        ascs = combo["ascendancies"] + [""] * (asc_count - len(combo["ascendancies"]))
+        gems = [g["name"] for g in combo["gems"]] + [""] * (gem_count - len(combo["gems"]))
+        writer.writerow([combo["roll"]] + ascs + gems)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="POE 流派抽籤 (命令列版)")
+    parser.add_argument("-n", "--count", type=int, default=1, help="要產生幾組")
+    parser.add_argument("--asc", type=int, default=1, dest="asc_count", help="每組昇華職業數量")
+    parser.add_argument("--gems", type=int, default=1, dest="gem_count", help="每組技能寶石數量")
+    parser.add_argument("--include", action="append", default=[], metavar="TAG", help="必須包含的標籤 (可重複)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="TAG", help="必須排除的標籤 (可重複)")
+    parser.add_argument("--seed", type=int, help="亂數種子 (相同種子 + 資料 = 相同結果)")
+    parser.add_argument("--builds", action="store_true",
+                        help="產生完整流派 (昇華 + 符合條件的主技能 + 相容的輔助寶石)，忽略 --asc / --gems 與加權")
+    parser.add_argument("--supports", type=int, default=SUPPORT_COUNT, dest="support_count",
+                        help=f"完整流派的輔助寶石數 (預設 {SUPPORT_COUNT})")
+    parser.add_argument("--session", metavar="FILE",
+                        help="不重複抽籤的 session 檔 (不存在會建立)，多次執行之間也不會抽到重複的")
+    parser.add_argument("--weights", metavar="FILE", help="權重檔 (JSON {名稱: 權重} 或 CSV 名稱,權重)，啟用加權抽籤")
+    parser.add_argument("--tag-weight", action="append", default=[], metavar="TAG=W",
+                        help="標籤倍率 (可重複)，例如 Minion=0.2，啟用加權抽籤")
+    parser.add_argument("--decay", type=float, metavar="F",
+                        help="抽到的項目權重乘上 F (例如 0.5)，降低重複出現，啟用加權抽籤")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--lang", choices=list(locales.TRANSLATIONS), default=locales.current_lang,
+                        help="使用哪個語言的資料庫")
+    parser.add_argument("--db", help="直接指定資料庫檔案 (優先於 --lang)")
+    args = parser.parse_args(argv)
+
+    tag_weights = {}
+    for item in args.tag_weight:
+        tag, _, weight = item.rpartition("=")
+        if not tag:
+            parser.error(f"--tag-weight expects TAG=W, got {item!r}")
+        try:
+            tag_weights[tag] = float(weight)
+        except ValueError:
+            parser.error(f"--tag-weight expects a number after '=', got {item!r}")
+    weighted = bool(args.weights or tag_weights or args.decay is not None)
+
+    # 整批抽完才存檔一次 (不用每組都寫檔)
+    session = RollSession(args.session, args.seed, autosave=False) if args.session else None
+
+    db = PoeDatabase(args.db or locale_db_name(args.lang))
+    if not args.db:
+        # 還沒更新過資料庫時，用附帶的快照
+        seed_database(db, args.lang)
+    try:
+        if args.weights:
+            try:
+                db.load_weights(args.weights)
+            except (OSError, ValueError) as e:
+                parser.error(f"--weights: cannot read {args.weights!r} ({e})")
+        if tag_weights:
+            db.set_tag_weights(tag_weights)
+        if args.builds:
+            combos = generate_builds(db, args.count, args.include, args.exclude, args.support_count, args.seed)
+            # 沒有任何主技能符合條件 (或沒有相容的輔助寶石) 時 generator 直接結束
+            first = next(combos, None)
+            if first is None and args.count > 0:
+                print("No build matches the given --include / --exclude filters.", file=sys.stderr)
+                return 1
+            combos = itertools.chain([first], combos) if first is not None else combos
+        else:
+            combos = generate_combos(db, args.count, args.asc_count, args.gem_count,
+                                     args.include, args.exclude, args.seed, weighted, args.decay, session)
+        try:
+            if args.builds and args.format == "csv":
+                write_builds_csv(combos, sys.stdout, args.support_count)
+            elif args.builds:
+                write_builds_jsonl(combos, sys.stdout)
+            elif args.format == "csv":
+                write_csv(combos, sys.stdout, args.asc_count, args.gem_count)
+            else:
+                write_jsonl(combos, sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # 接到 head 之類的指令時，對方關掉管線就安靜結束
+            sys.stdout = None
+    finally:
+        if session:
+            session.save()
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# sampler.py
+# 不重複隨機抽樣 (取代 SQL 的 ORDER BY RANDOM())，以及依權重抽樣 (alias method)
+import heapq
+import random
+
+def sample_indices(n, k, rng=random):
+    """
+    從 range(n) 抽出 k 個不重複的索引，時間與記憶體都是 O(k)。
+    稀疏版 partial Fisher–Yates：只記錄被交換過的位置，不用複製整個陣列。
+    """
+    k = min(k, n)
+    swapped = {}
+    picked = []
+    for i in range(k):
+        j = rng.randrange(i, n)
+        picked.append(swapped.get(j, j))
+        swapped[j] = swapped.get(i, i)
+    return picked
+
+class Sampler:
+    """包一個 random.Random，給定 seed 時結果可重現"""
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def sample(self, pool, k):
+        """從 pool (list) 抽 k 個不重複項目，順序即抽出順序"""
+        return [pool[i] for i in sample_indices(len(pool), k, self.rng)]
+
+    def weighted_sample(self, pool, table, k):
+        """依 table (WeightedPool，索引對應 pool) 的權重抽 k 個不重複項目"""
+        return [pool[i] for i in table.sample(k, self.rng)]
+
+class AliasTable:
+    """
+    Walker / Vose alias method：建表 O(n)，之後每次依權重抽一個索引都是 O(1)。
+    權重 <= 0 的項目永遠不會被抽到；全部為 0 時 total 為 0，不能抽。
+    """
+    def __init__(self, weights):
+        n = len(weights)
+        self.n = n
+        self.total = float(sum(w for w in weights if w > 0))
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if n == 0 or self.total <= 0:
+            return
+
+        scaled = [max(w, 0.0) * n / self.total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩下的是浮點誤差造成的，機率視為 1
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng=random):
+        r = rng.random() * self.n
+        i = int(r)
+        return i if r - i < self.prob[i] else self.alias[i]
+
+class WeightedPool:
+    """
+    兩層 alias table：項目切成 block_size 一組，每組一張表，再用一張表依各組總權重選組。
+    抽一個仍是 O(1)；改少數權重時只重建受影響的組 + 上層表，不用整個重建。
+    """
+    def __init__(self, weights, block_size=None):
+        self.weights = [float(w) for w in weights]
+        n = len(self.weights)
+        # 預設每組約 sqrt(n) 個，更新時重建的量最少
+        self.block_size = block_size or max(64, int(n ** 0.5))
+        self.blocks = [self._build_block(b) for b in range(0, n, self.block_size)]
+        self._build_top()
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def total(self):
+        return self.top.total
+
+    def _build_block(self, start):
+        return AliasTable(self.weights[start:start + self.block_size])
+
+    def _build_top(self):
+        self.top = AliasTable([block.total for block in self.blocks])
+        # 權重大於 0 的項目數 (不重複抽樣時用來判斷抽不抽得滿)
+        self.positive = sum(1 for w in self.weights if w > 0)
+
+    def update(self, changes):
+        """
+        changes：{索引: 新權重}，回傳重建了幾組
+        """
+        dirty = set()
+        for i, w in changes.items():
+            if self.weights[i] != w:
+                self.weights[i] = float(w)
+                dirty.add(i // self.block_size)
+        for b in dirty:
+            self.blocks[b] = self._build_block(b * self.block_size)
+        if dirty:
+            self._build_top()
+        return len(dirty)
+
+    def draw(self, rng=random):
+        # 等同 self.top.draw() 再 block.draw()，展開來少兩次方法呼叫
+        top = self.top
+        r = rng.random() * top.n
+        b = int(r)
+        if r - b >= top.prob[b]:
+            b = top.alias[b]
+        block = self.blocks[b]
+        r = rng.random() * block.n
+        i = int(r)
+        if r - i >= block.prob[i]:
+            i = block.alias[i]
+        return b * self.block_size + i
+
+    def sample(self, k, rng=random):
+        """
+        依權重抽 k 個不重複的索引 (順序即抽出順序)。
+        k 遠小於項目數時用 alias 抽、重複就重抽；否則改用 Efraimidis–Spirakis (O(n log k))。
+        """
+        k = min(k, self.positive)
+        if k <= 0:
+            return []
+        if k <= self.positive // 4:
+            picked = []
+            seen = set()
+            attempts = 0
+            while len(picked) < k and attempts < 20 * k:
+                attempts += 1
+                i = self.draw(rng)
+                if i not in seen:
+                    seen.add(i)
+                    picked.append(i)
+            if len(picked) == k:
+                return picked
+        # key = u^(1/w)，取最大的 k 個，等同依權重逐一不放回抽取
+        keys = ((rng.random() ** (1.0 / w), i) for i, w in enumerate(self.weights) if w > 0)
+        return [i for _, i in heapq.nlargest(k, keys)]
@@ -1,89 +1,594 @@
 # scraper.py
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+# selenium / webdriver_manager 只在 PoeScraper 真的被使用時才載入 (http 後端與 GUI 啟動都不需要)
+from urllib.parse import urljoin
+import json
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from bs4 import BeautifulSoup
 import locales # 匯入剛剛寫好的字庫
+import metrics
+
+# poedb 網址：可用 POE_BASE_URL 環境變數或 set_base_url() 換成本機的替身伺服器 (見 poedb_stub.py)
+BASE_URL_ENV = "POE_BASE_URL"
+DEFAULT_BASE_URL = "https://poedb.tw"
+base_url = (os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip("/")
+# 可選的爬蟲後端：http = requests + BeautifulSoup，selenium = Chrome
+BACKENDS = ("http", "selenium")
+# 每個語言要抓的頁面
+PAGES = ("ascendancies", "gems", "supports")
+# 頁面對應的爬蟲方法 / poedb 網址路徑 / 完成時的 log
+PAGE_METHODS = {
+    "ascendancies": "scrape_ascendancies",
+    "gems": "scrape_active_gems",
+    "supports": "scrape_support_gems",
+}
+PAGE_PATHS = {
+    "ascendancies": "Ascendancy_class",
+    "gems": "Skill_Gems",
+    "supports": "Support_Gems",
+}
+PAGE_DONE_KEYS = {
+    "ascendancies": "log_asc_done",
+    "gems": "log_gem_done",
+    "supports": "log_support_done",
+}
+
+ASCENDANCY_SELECTOR = "div.flex-grow-1 figcaption a"
+GEM_ROW_SELECTOR = "table.filters tbody tr"
+GEM_NAME_SELECTOR = "td:nth-child(2) a"
+GEM_TAGS_SELECTOR = ".gem_tags"
+
+# chromedriver 解析結果的快取檔，以及多久重新檢查一次版本
+DRIVER_CACHE_FILE = "driver_cache.json"
+DRIVER_RECHECK_DAYS = 7
+
+# PoeScraper 的 script 模式：在瀏覽器內一次取完整頁資料，避免逐列 WebDriver round-trip
+ASCENDANCY_SCRIPT = """
+return JSON.stringify(Array.from(document.querySelectorAll(arguments[0]), el => el.innerText));
+"""
+
+# 取回 selector 命中的元素原始 HTML (Selenium 後端用來算頁面內容雜湊)
+OUTER_HTML_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0]), el => el.outerHTML).join("\\n");
+"""
+
+GEM_ROWS_SCRIPT = """
+const [rowSel, nameSel, tagsSel] = arguments;
+const rows = [];
+for (const row of document.querySelectorAll(rowSel)) {
+    const a = row.querySelector(nameSel);
+    if (!a) continue;
+    const t = row.querySelector(tagsSel);
+    rows.push({
+        name: a.innerText,
+        link: a.href,
+        tags: t ? t.innerText.trim() : row.getAttribute("data-tags")
+    });
+}
+return JSON.stringify(rows);
+"""
+
+def _report_timing(url, load_time, extract_time, count, source="http"):
+    """印出單頁的載入 / 解析時間，並記進 metrics (scraper.<source>.*)"""
+    print(f"[timing] {url}: load {load_time:.2f}s, extract {extract_time:.2f}s, {count} rows")
+    metrics.record(f"scraper.{source}.extract", extract_time)
+    metrics.count(f"scraper.{source}.rows", count)
+    metrics.count(f"scraper.{source}.pages")
+    if count:
+        metrics.record(f"scraper.{source}.extract_per_row", extract_time / count)
+
+def set_base_url(url=None):
+    """換掉 poedb 網址 (None = 還原成 https://poedb.tw)，之後開始的爬取都會用新網址"""
+    global base_url
+    base_url = (url or DEFAULT_BASE_URL).rstrip("/")
+
+def page_url(lang_code, page):
+    """頁面的完整網址 ({base_url}/{lang}/...)"""
+    return f"{base_url}/{lang_code}/{PAGE_PATHS[page]}"
+
+def create_scraper(backend="http", headless=True, lang_code=None):
+    """依後端名稱建立爬蟲 (預設 http，Selenium 當備援)；lang_code 預設為目前介面語言"""
+    if backend == "selenium":
+        return PoeScraper(headless=headless, lang_code=lang_code)
+    return HttpScraper(headless=headless, lang_code=lang_code)
+
+def _text(elem):
+    """模擬 Selenium 的 .text：合併空白並去頭尾"""
+    return " ".join(elem.get_text(" ").split())
+
+def iter_ascendancies(html):
+    """從 Ascendancy_class 頁面 HTML 逐一產生昇華職業名稱 (不重複)"""
+    soup = BeautifulSoup(html, "html.parser")
+    seen = set()
+    for elem in soup.select(ASCENDANCY_SELECTOR):
+        name = _text(elem)
+        if name and name not in seen:
+            seen.add(name)
+            yield name
+
+def parse_ascendancies(html):
+    """從 Ascendancy_class 頁面 HTML 解析昇華職業名稱"""
+    return list(iter_ascendancies(html))
+
+def iter_gem_rows(html, base_url=""):
+    """
+    從 Skill_Gems (或同樣表格格式的 Support_Gems) 頁面 HTML 逐列產生寶石 (name / tags / link)，
+    解析一列就交出一列，不在記憶體裡累積整張表
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for row in soup.select(GEM_ROW_SELECTOR):
+        name_elem = row.select_one(GEM_NAME_SELECTOR)
+        if name_elem is None:
+            continue
+        gem_name = _text(name_elem)
+        gem_link = urljoin(base_url, name_elem.get("href", ""))
+
+        tags_elem = row.select_one(GEM_TAGS_SELECTOR)
+        tags_text = _text(tags_elem) if tags_elem is not None else row.get("data-tags")
+
+        if gem_name:
+            yield {
+                "name": gem_name,
+                "tags": tags_text,
+                "link": gem_link
+            }
+
+def parse_active_gems(html, base_url=""):
+    """從 Skill_Gems (或同樣表格格式的 Support_Gems) 頁面 HTML 解析寶石 (name / tags / link)"""
+    return list(iter_gem_rows(html, base_url))
+
+class UpdateCancelled(Exception):
+    """使用者取消了更新"""
+
+def _load_driver_cache():
+    try:
+        with open(DRIVER_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# 多個 PoeScraper 會同時啟動 (BrowserSession / scrape_locales)，讀改寫 driver_cache.json 要互斥
+_driver_cache_lock = threading.Lock()
+
+def _update_driver_cache(**fields):
+    """
+    把 fields 併進 driver_cache.json (有變才寫)。先寫暫存檔再 os.replace，
+    中途被打斷或同時寫入都不會留下壞掉的檔案 (壞檔會讓下次啟動重新連網解析)
+    """
+    with _driver_cache_lock:
+        cache = _load_driver_cache()
+        if all(cache.get(k) == v for k, v in fields.items()):
+            return
+        cache.update(fields)
+        tmp = f"{DRIVER_CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, DRIVER_CACHE_FILE)
+
+def resolve_chromedriver(force=False):
+    """
+    回傳 chromedriver 路徑。ChromeDriverManager 的結果存在 driver_cache.json，
+    DRIVER_RECHECK_DAYS 天內直接用快取，不再每次連網檢查版本；檢查失敗 (離線) 時也沿用快取。
+    force=True 會強制重新解析 (Chrome 啟動失敗時使用)。
+    """
+    cache = _load_driver_cache()
+    path = cache.get("path")
+    cached = bool(path) and os.path.exists(path)
+    age = time.time() - cache.get("resolved_at", 0)
+    if cached and not force and age < DRIVER_RECHECK_DAYS * 86400:
+        return path
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        if cached:
+            print(f"Driver check failed ({e}), using cached chromedriver: {path}")
+            return path
+        raise
+
+    _update_driver_cache(path=path, resolved_at=time.time())
+    return path
+
+def _record_driver_versions(driver):
+    """記下實際啟動的 Chrome / chromedriver 版本 (有變才寫檔)"""
+    caps = driver.capabilities
+    versions = {
+        "browser_version": caps.get("browserVersion"),
+        "driver_version": caps.get("chrome", {}).get("chromedriverVersion", "").split(" ")[0],
+    }
+    _update_driver_cache(**versions)
 
 class PoeScraper:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, extract_mode="script", lang_code=None):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.support.ui import WebDriverWait
+
         self.options = Options()
         if headless:
             self.options.add_argument("--headless")
         self.options.add_argument("user-agent=Mozilla/5.0")
         
-        # 取得當前語言代碼 (tw 或 us)
-        self.lang_code = locales.get_lang_code()
+        # 取得語言代碼 (tw 或 us)，沒指定就用當前語言
+        self.lang_code = lang_code or locales.get_lang_code()
+        # script = 一次注入 JS 取回整頁資料；element = 逐列呼叫 WebDriver (舊做法)
+        self.extract_mode = extract_mode
+        # {頁面: 這次載入的資料區塊內容雜湊} (串流寫入靠它判斷能不能從斷點接著寫)
+        self.page_hashes = {}
         
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=self.options)
+        # 用快取的 chromedriver 路徑；啟動失敗 (例如 Chrome 升級後版本不合) 才重新解析
+        with metrics.timer("scraper.selenium.start"):
+            try:
+                self.driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=self.options)
+            except Exception as e:
+                print(f"Chrome failed to start ({e}), re-resolving chromedriver...")
+                metrics.count("scraper.selenium.driver_retry")
+                self.driver = webdriver.Chrome(service=Service(resolve_chromedriver(force=True)), options=self.options)
+        _record_driver_versions(self.driver)
         self.wait = WebDriverWait(self.driver, 10)
         
-        print(locales.get_text("log_start_scrape"))
+        print(locales.get_text("log_start_scrape", self.lang_code))
+
+    def _load(self, url, selector):
+        """開啟頁面並等到 selector 出現，回傳花費秒數"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
 
-    def scrape_ascendancies(self):
-        # 動態網址：利用 f-string 插入 lang_code
-        url = f"https://poedb.tw/{self.lang_code}/Ascendancy_class"
         print(f"Go to: {url}")
-        self.driver.get(url)
-        
-        ascendancy_list = []
-        try:
-            selector = "div.flex-grow-1 figcaption a"
+        start = time.perf_counter()
+        # get = Chrome 載入頁面 (含網路)，wait = 等到表格出現
+        with metrics.timer("scraper.selenium.get"):
+            self.driver.get(url)
+        with metrics.timer("scraper.selenium.wait"):
             self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-            elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-            
-            for elem in elements:
-                name = elem.text.strip()
-                if name and name not in ascendancy_list:
-                    ascendancy_list.append(name)
-            
-            print(locales.get_text("log_asc_done"))
-            return ascendancy_list
+        return time.perf_counter() - start
+
+    def _run_script(self, script, *args):
+        """執行注入的 JS，結果以 JSON 字串一次傳回"""
+        return json.loads(self.driver.execute_script(script, *args))
+
+    def open_page(self, page):
+        """
+        開啟頁面，回傳逐列產生資料的 iterator (昇華為名稱、寶石為 dict)。
+        script 模式一次取回整頁後逐列交出；element 模式每讀一列就交出一列。
+        """
+        url = page_url(self.lang_code, page)
+        selector = ASCENDANCY_SELECTOR if page == "ascendancies" else GEM_ROW_SELECTOR
+        load_time = self._load(url, selector)
+        # 整頁 HTML 會因廣告等動態內容而不同，只拿資料所在的元素算雜湊
+        content = self.driver.execute_script(OUTER_HTML_SCRIPT, selector) or ""
+        self.page_hashes[page] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return self._iter_rows(url, page, load_time)
+
+    def _iter_rows(self, url, page, load_time):
+        start = time.perf_counter()
+        count = 0
+        if page == "ascendancies":
+            if self.extract_mode == "script":
+                names = self._run_script(ASCENDANCY_SCRIPT, ASCENDANCY_SELECTOR)
+            else:
+                from selenium.webdriver.common.by import By
+                names = (elem.text for elem in self.driver.find_elements(By.CSS_SELECTOR, ASCENDANCY_SELECTOR))
+            seen = set()
+            for name in names:
+                name = name.strip()
+                if name and name not in seen:
+                    seen.add(name)
+                    count += 1
+                    yield name
+        else:
+            if self.extract_mode == "script":
+                rows = self._scrape_gem_rows_script()
+            else:
+                rows = self._scrape_gem_rows_element()
+            for row in rows:
+                count += 1
+                yield row
+
+        _report_timing(url, load_time, time.perf_counter() - start, count, "selenium")
+        print(locales.get_text(PAGE_DONE_KEYS[page]))
+
+    def _collect(self, page):
+        """整頁收成 list (舊介面)，失敗時回傳 []"""
+        try:
+            return list(self.open_page(page))
         except Exception as e:
             print(f"Error: {e}")
+            metrics.count("scraper.selenium.errors")
             return []
 
+    def scrape_ascendancies(self):
+        return self._collect("ascendancies")
+
     def scrape_active_gems(self):
-        # 動態網址
-        url = f"https://poedb.tw/{self.lang_code}/Skill_Gems" 
-        print(f"Go to: {url}")
-        self.driver.get(url)
+        return self._collect("gems")
 
-        gems_data = []
-        try:
-            table_selector = "table.filters tbody tr"
-            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, table_selector)))
-            rows = self.driver.find_elements(By.CSS_SELECTOR, table_selector)
-            
-            for row in rows: 
+    def scrape_support_gems(self):
+        # 輔助寶石頁面跟技能寶石是同一種表格
+        return self._collect("supports")
+
+    def _scrape_gem_rows_script(self):
+        """一次 round-trip 取回所有列的 name / link / tags"""
+        rows = self._run_script(GEM_ROWS_SCRIPT, GEM_ROW_SELECTOR, GEM_NAME_SELECTOR, GEM_TAGS_SELECTOR)
+        return (
+            {"name": r["name"].strip(), "tags": r["tags"], "link": r["link"]}
+            for r in rows if r["name"].strip()
+        )
+
+    def _scrape_gem_rows_element(self):
+        """逐列讀取 (每個欄位都是一次 WebDriver 呼叫)，讀到一列就交出一列"""
+        from selenium.webdriver.common.by import By
+
+        rows = self.driver.find_elements(By.CSS_SELECTOR, GEM_ROW_SELECTOR)
+        
+        for row in rows: 
+            try:
+                name_elem = row.find_element(By.CSS_SELECTOR, GEM_NAME_SELECTOR)
+                gem_name = name_elem.text.strip()
+                gem_link = name_elem.get_attribute("href")
+                
+                tags_text = ""
                 try:
-                    name_elem = row.find_element(By.CSS_SELECTOR, "td:nth-child(2) a")
-                    gem_name = name_elem.text.strip()
-                    gem_link = name_elem.get_attribute("href")
-                    
-                    tags_text = ""
-                    try:
-                        tags_elem = row.find_element(By.CSS_SELECTOR, ".gem_tags")
-                        tags_text = tags_elem.text.strip()
-                    except:
-                        tags_text = row.get_attribute("data-tags")
-                    
-                    if gem_name:
-                        gems_data.append({
-                            "name": gem_name,
-                            "tags": tags_text,
-                            "link": gem_link
-                        })
+                    tags_elem = row.find_element(By.CSS_SELECTOR, GEM_TAGS_SELECTOR)
+                    tags_text = tags_elem.text.strip()
                 except:
-                    continue
-            print(locales.get_text("log_gem_done"))
-            return gems_data
+                    tags_text = row.get_attribute("data-tags")
+            except:
+                continue
+            if gem_name:
+                yield {
+                    "name": gem_name,
+                    "tags": tags_text,
+                    "link": gem_link
+                }
+
+    def close(self):
+        self.driver.quit()
+
+class BrowserSession:
+    """
+    長時間保留的 Chrome：多次爬取 (以及同一次更新的不同語言) 共用已開好的瀏覽器，
+    不用每次都付出啟動 Chrome 的成本。用完呼叫 close()。
+    """
+    def __init__(self, headless=True):
+        self.headless = headless
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, lang_code):
+        """取一個閒置的瀏覽器 (沒有就開新的)，並切到指定語言"""
+        while True:
+            with self._lock:
+                scraper = self._idle.pop() if self._idle else None
+            if scraper is None:
+                scraper = PoeScraper(headless=self.headless, lang_code=lang_code)
+                break
+            try:
+                scraper.driver.current_url  # 確認瀏覽器還活著
+                break
+            except Exception:
+                scraper.close()
+        scraper.lang_code = lang_code
+        # 上一個語言留下的頁面雜湊不能沿用 (開頁失敗時會被當成這個語言的)
+        scraper.page_hashes = {}
+        return scraper
+
+    def release(self, scraper):
+        with self._lock:
+            self._idle.append(scraper)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for scraper in idle:
+            try:
+                scraper.close()
+            except Exception:
+                pass
+
+class HttpScraper:
+    """
+    不開瀏覽器的爬蟲：直接用 HTTP 抓 poedb 頁面再用 BeautifulSoup 解析。
+    某頁抓不到資料時 (例如被擋或改成 JS 動態產生)，會自動改用 Selenium 重抓該頁。
+    有 cache (HttpCache) 時走磁碟快取；頁面內容雜湊跟 known_hashes 相同時跳過解析，回傳 None。
+    """
+    def __init__(self, headless=True, fallback=True, timeout=10, lang_code=None, cache=None, known_hashes=None):
+        self.headless = headless
+        self.timeout = timeout
+        self.lang_code = lang_code or locales.get_lang_code()
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "Mozilla/5.0"
+        self.cache = cache
+        # 離線重播時不能開 Chrome 重抓
+        self.fallback = fallback and not (cache and cache.offline)
+        # {頁面: 上次寫入資料庫時的內容雜湊} / {頁面: 這次抓到的內容雜湊}
+        self.known_hashes = known_hashes or {}
+        self.page_hashes = {}
+        self._fallback_scraper = None
+
+        print(locales.get_text("log_start_scrape", self.lang_code))
+
+    def fetch(self, url, page=None):
+        print(f"Go to: {url}")
+        metrics.count("scraper.http.requests")
+        with metrics.timer("scraper.http.fetch"):
+            return self._fetch(url, page)
+
+    def _fetch(self, url, page):
+        if self.cache:
+            html, body_hash = self.cache.fetch(self.session, url, self.lang_code, self.timeout)
+        else:
+            resp = self.session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+            html = resp.text
+            body_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        if page:
+            self.page_hashes[page] = body_hash
+        return html
+
+    def _unchanged(self, page):
+        """這頁內容跟上次寫入資料庫時一樣"""
+        return page in self.page_hashes and self.page_hashes[page] == self.known_hashes.get(page)
+
+    def _get_fallback(self):
+        """需要時才啟動 Chrome"""
+        if self._fallback_scraper is None:
+            self._fallback_scraper = PoeScraper(headless=self.headless, lang_code=self.lang_code)
+        return self._fallback_scraper
+
+    def open_page(self, page):
+        """
+        抓取頁面，回傳逐列產生資料的 iterator (昇華為名稱、寶石為 dict)；
+        內容跟上次寫入資料庫時一樣則回傳 None。
+        抓不到或一列都解析不到時 (例如被擋或改成 JS 動態產生)，自動改用 Selenium 重抓這頁。
+        """
+        url = page_url(self.lang_code, page)
+        start = time.perf_counter()
+        try:
+            html = self.fetch(url, page)
         except Exception as e:
+            if not self.fallback:
+                raise
             print(f"Error: {e}")
+            metrics.count("scraper.http.errors")
+            return self._fallback_page(page)
+        if self._unchanged(page):
+            print(f"{url}: unchanged, skipped")
+            return None
+        return self._iter_rows(url, page, html, time.perf_counter() - start)
+
+    def _iter_rows(self, url, page, html, load_time):
+        start = time.perf_counter()
+        rows = iter_ascendancies(html) if page == "ascendancies" else iter_gem_rows(html, url)
+        count = 0
+        for row in rows:
+            count += 1
+            yield row
+        _report_timing(url, load_time, time.perf_counter() - start, count)
+        if count == 0 and self.fallback:
+            yield from self._fallback_page(page)
+            return
+        print(locales.get_text(PAGE_DONE_KEYS[page]))
+
+    def _fallback_page(self, page):
+        print("HTTP backend got no data, falling back to Selenium...")
+        metrics.count("scraper.http.fallback")
+        self.page_hashes.pop(page, None)
+        fallback = self._get_fallback()
+        rows = fallback.open_page(page)
+        if page in fallback.page_hashes:
+            self.page_hashes[page] = fallback.page_hashes[page]
+        return rows
+
+    def _collect(self, page):
+        """整頁收成 list (舊介面)；沒變的頁面回傳 None，失敗時回傳 []"""
+        try:
+            rows = self.open_page(page)
+            return None if rows is None else list(rows)
+        except Exception as e:
+            print(f"Error: {e}")
+            metrics.count("scraper.http.errors")
             return []
 
+    def scrape_ascendancies(self):
+        return self._collect("ascendancies")
+
+    def scrape_active_gems(self):
+        return self._collect("gems")
+
+    def scrape_support_gems(self):
+        return self._collect("supports")
+
     def close(self):
-        self.driver.quit()
\ No newline at end of file
+        self.session.close()
+        if self._fallback_scraper:
+            self._fallback_scraper.close()
+
+def scrape_locales(lang_codes, backend="http", max_workers=4, headless=True, on_page_done=None,
+                   cache=None, known_hashes=None, session=None, cancel_event=None, sink=None, skip_pages=None):
+    """
+    同時爬取多個語言、多個頁面，每個 (語言, 頁面) 是一個工作，最多 max_workers 個同時進行。
+    每個 worker thread 各自保留自己的爬蟲 (Selenium driver / requests session 不能跨 thread 共用)。
+    cache / known_hashes ({語言: {頁面: 雜湊}}) 只用在 http 後端，內容沒變的頁面結果為 None。
+    session (BrowserSession) 只用在 selenium 後端：從中借用已開好的瀏覽器，結束後歸還而不關閉。
+    on_page_done(lang_code, page, count) 會在每頁完成時被呼叫 (在 worker thread 裡)，沒變的頁面 count 為 None。
+    cancel_event (threading.Event) 被設定後，還沒開始的頁面不再抓取並丟出 UpdateCancelled。
+    回傳 {lang_code: {"ascendancies": [...], "gems": [...], "supports": [...], "hashes": {頁面: 雜湊}}}
+
+    串流模式：有 sink 時不收集整頁資料，改成呼叫 sink(lang_code, page, open_rows) (在 worker thread 裡)。
+    open_rows() 開啟頁面並回傳 (rows, page_hash)：rows 是邊解析邊產生資料的 iterator，頁面沒變時為 None；
+    page_hash() 是這頁目前的內容雜湊，rows 讀完後要再取一次 (http 後端一列都解析不到時，
+    rows 讀到一半會改用 Selenium 重抓，雜湊也跟著換掉)。開頁失敗的例外由 sink 自己處理。結果與 on_page_done 收到的都是 sink 的回傳值。
+    skip_pages ({語言: {頁面: 結果}}) 是上次已經完整暫存的頁面，直接略過不抓，結果就是給定的值。
+    """
+    local = threading.local()
+    created = []
+    lock = threading.Lock()
+    known_hashes = known_hashes or {}
+    skip_pages = skip_pages or {}
+
+    def get_scraper(lang_code):
+        if not hasattr(local, "scrapers"):
+            local.scrapers = {}
+        if lang_code not in local.scrapers:
+            if backend == "selenium":
+                scraper = create_scraper(backend, headless=headless, lang_code=lang_code)
+            else:
+                scraper = HttpScraper(headless=headless, lang_code=lang_code, cache=cache,
+                                      known_hashes=known_hashes.get(lang_code))
+            local.scrapers[lang_code] = scraper
+            with lock:
+                created.append(scraper)
+        return local.scrapers[lang_code]
+
+    def run(lang_code, page):
+        if cancel_event and cancel_event.is_set():
+            raise UpdateCancelled()
+        if page in skip_pages.get(lang_code, {}):
+            print(f"[{lang_code}] {page}: already staged, skipped")
+            return skip_pages[lang_code][page], None
+        borrowed = backend == "selenium" and session is not None
+        scraper = session.acquire(lang_code) if borrowed else get_scraper(lang_code)
+        try:
+            if sink:
+                def page_hash():
+                    return getattr(scraper, "page_hashes", {}).get(page)
+
+                def open_rows():
+                    return scraper.open_page(page), page_hash
+                data = sink(lang_code, page, open_rows)
+            else:
+                data = getattr(scraper, PAGE_METHODS[page])()
+            # 歸還之前先記下雜湊，歸還後瀏覽器可能馬上被別的 worker 借走、換成別的語言
+            body_hash = getattr(scraper, "page_hashes", {}).get(page)
+        finally:
+            if borrowed:
+                session.release(scraper)
+        return data, body_hash
+
+    jobs = [(lang_code, page) for lang_code in lang_codes for page in PAGES]
+    results = {lang_code: {"hashes": {}} for lang_code in lang_codes}
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {pool.submit(run, *job): job for job in jobs}
+            for future in as_completed(futures):
+                lang_code, page = futures[future]
+                data, body_hash = future.result()
+                results[lang_code][page] = data
+                if body_hash:
+                    results[lang_code]["hashes"][page] = body_hash
+                if on_page_done:
+                    on_page_done(lang_code, page, data if data is None or sink else len(data))
+    finally:
+        for scraper in created:
+            scraper.close()
+
+    print(f"[timing] {len(jobs)} pages with {max_workers} workers: {time.perf_counter() - start:.2f}s")
+    return results
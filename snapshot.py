@@ -0,0 +1,135 @@
+# snapshot.py
+# 預先打包好的資料快照：每個語言一個 gzip 壓縮的 JSON (昇華、技能寶石 + 標籤、輔助寶石、詳細資料)
+# 新安裝時直接匯入，不用開 Chrome 也不用爬網頁就能抽籤
+#   python init_data.py --snapshot-only          (用現有資料庫產生快照)
+#   python init_data.py --snapshot               (更新完順便產生)
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+import metrics
+
+# 格式版本：欄位有變動時 +1，讀到不認得的版本直接拒絕
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_NAME_TEMPLATE = "poe_snapshot_{lang}.json.gz"
+# 快照裡的資料欄位
+SNAPSHOT_KEYS = ("ascendancies", "gems", "supports", "details")
+
+class SnapshotError(Exception):
+    """快照檔壞掉或版本不符"""
+
+def snapshot_path(lang_code):
+    """語言代碼對應的快照檔名"""
+    return SNAPSHOT_NAME_TEMPLATE.format(lang=lang_code)
+
+@metrics.timed("snapshot.export")
+def export_snapshot(db, path, lang_code=None):
+    """
+    把資料庫內容寫成快照 (先寫暫存檔再換名，中途失敗不會留下壞檔)，回傳摘要 {rows, bytes}。
+    寶石存成 [名稱, 標籤字串, 連結] 的列 (標籤索引匯入時重建)，gzip 標頭不記檔案時間。
+    """
+    cur = db.cursor
+    data = {
+        "format": SNAPSHOT_FORMAT,
+        "lang": lang_code,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data_version": db.get_data_version(),
+        "ascendancies": [r[0] for r in cur.execute('SELECT name FROM ascendancies ORDER BY id').fetchall()],
+        "gems": cur.execute('SELECT name, tags, link FROM skill_gems ORDER BY id').fetchall(),
+        "supports": cur.execute('SELECT name, tags, link FROM support_gems ORDER BY id').fetchall(),
+        "details": cur.execute('''
+            SELECT g.name, d.level, d.colour, d.mana_cost, d.quality
+            FROM gem_details d JOIN skill_gems g ON g.id = d.gem_id
+            ORDER BY g.id
+        ''').fetchall(),
+    }
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gz:
+            gz.write(raw)
+    os.replace(tmp, path)
+    return {
+        "rows": {key: len(data[key]) for key in SNAPSHOT_KEYS},
+        "bytes": os.path.getsize(path),
+    }
+
+def read_snapshot(path):
+    """讀取並檢查快照，回傳內容 dict"""
+    try:
+        with gzip.open(path, "rb") as f:
+            data = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"{path}: {e}") from e
+    if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"{path}: unsupported snapshot format {data.get('format') if isinstance(data, dict) else None}")
+    missing = [key for key in SNAPSHOT_KEYS if key not in data]
+    if missing:
+        raise SnapshotError(f"{path}: missing {', '.join(missing)}")
+    for key, check in ROW_CHECKS.items():
+        rows = data[key]
+        if not isinstance(rows, list):
+            raise SnapshotError(f"{path}: {key} is not a list")
+        for i, row in enumerate(rows):
+            if not check(row):
+                raise SnapshotError(f"{path}: malformed {key} row {i}: {row!r}")
+    return data
+
+def _is_gem_row(row):
+    """寶石列：[名稱, 標籤字串, 連結]，標籤與連結可以是 null"""
+    return (isinstance(row, list) and len(row) == 3 and isinstance(row[0], str)
+            and all(v is None or isinstance(v, str) for v in row[1:]))
+
+def _is_detail_row(row):
+    """詳細資料列：[寶石名稱, 等級, 顏色, 魔力消耗, 品質]"""
+    return isinstance(row, list) and len(row) == 5 and isinstance(row[0], str)
+
+# 各欄位每一列的格式檢查 (匯入前先全部檢查過，格式不對就整份拒絕)
+ROW_CHECKS = {
+    "ascendancies": lambda row: isinstance(row, str),
+    "gems": _is_gem_row,
+    "supports": _is_gem_row,
+    "details": _is_detail_row,
+}
+
+@metrics.timed("snapshot.import")
+def import_snapshot(db, path):
+    """
+    匯入快照 (清空資料庫與寫入在同一個交易內，見 PoeDatabase.replace_all_data)，回傳各類筆數。
+    語言切換、快取、抽籤 session 都靠 data_version 判斷，匯入後自然會重新載入。
+    快照內容有問題 (包含寫入時被資料庫拒絕) 一律丟出 SnapshotError，原本的資料不動。
+    """
+    data = read_snapshot(path)
+    gems = [{"name": n, "tags": t, "link": l} for n, t, l in data["gems"]]
+    supports = [{"name": n, "tags": t, "link": l} for n, t, l in data["supports"]]
+    details = [(name, {"level": level, "colour": colour, "mana_cost": mana_cost, "quality": quality})
+               for name, level, colour, mana_cost, quality in data["details"]]
+    try:
+        db.replace_all_data(data["ascendancies"], gems, supports, details)
+    except sqlite3.Error as e:
+        raise SnapshotError(f"{path}: {e}") from e
+    return {"ascendancies": len(data["ascendancies"]), "gems": len(gems),
+            "supports": len(supports), "details": len(data["details"])}
+
+def seed_database(db, lang_code, path=None):
+    """
+    資料庫還是空的 (第一次啟動) 而且有快照時，匯入快照；回傳是否有匯入。
+    快照壞掉時只印出警告，資料庫保持空的 (使用者還是可以按「更新資料庫」)。
+    """
+    path = path or snapshot_path(lang_code)
+    if not os.path.exists(path):
+        return False
+    has_data = db.cursor.execute('SELECT EXISTS (SELECT 1 FROM skill_gems)').fetchone()[0]
+    if has_data:
+        return False
+    start = time.perf_counter()
+    try:
+        counts = import_snapshot(db, path)
+    except SnapshotError as e:
+        print(f"[snapshot] {e}")
+        return False
+    print(f"[snapshot] {path}: {counts['gems']} gems, {counts['ascendancies']} ascendancies "
+          f"loaded in {time.perf_counter() - start:.3f}s")
+    return True
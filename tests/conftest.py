@@ -0,0 +1,34 @@
+# tests/conftest.py
+# 讓測試直接 import 專案根目錄的模組 (scraper / database / ...)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+class FakeResponse:
+    """requests.Response 的替身 (只有爬蟲用到的欄位)"""
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class FakeSession:
+    """requests.Session 的替身：依序回傳 responses，並記下每次請求的 (url, headers)"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        self.calls.append((url, dict(headers or {})))
+        return self.responses.pop(0)
@@ -0,0 +1,51 @@
+# tests/test_browser_session.py
+# selenium 後端共用瀏覽器 (BrowserSession)：各語言的頁面雜湊不能混在一起
+from types import SimpleNamespace
+
+import scraper
+from scraper import BrowserSession, PoeScraper, scrape_locales
+
+# 開頁會失敗的 (語言, 頁面)
+FAILING = set()
+
+class FakeBrowser(PoeScraper):
+    """不開 Chrome 的 PoeScraper：雜湊直接用 語言-頁面"""
+    def __init__(self, headless=True, lang_code=None):
+        self.lang_code = lang_code
+        self.page_hashes = {}
+        self.driver = SimpleNamespace(current_url="about:blank")
+
+    def open_page(self, page):
+        if (self.lang_code, page) in FAILING:
+            raise RuntimeError("page did not load")
+        self.page_hashes[page] = f"{self.lang_code}-{page}"
+        return iter([f"{self.lang_code} {page}"])
+
+    def close(self):
+        pass
+
+class StealingSession(BrowserSession):
+    """歸還後瀏覽器馬上被別的 worker 借走、換掉雜湊的情況"""
+    def release(self, browser):
+        browser.page_hashes = {page: "other-language" for page in browser.page_hashes}
+        super().release(browser)
+
+def test_hash_is_captured_before_the_browser_is_released(monkeypatch):
+    monkeypatch.setattr(scraper, "PoeScraper", FakeBrowser)
+    session = StealingSession()
+    results = scrape_locales(["tw", "us"], "selenium", max_workers=1, session=session)
+    for lang_code in ("tw", "us"):
+        assert results[lang_code]["hashes"] == {page: f"{lang_code}-{page}" for page in scraper.PAGES}
+    assert len(session._idle) == 1
+
+def test_failed_page_does_not_reuse_previous_language_hash(monkeypatch):
+    monkeypatch.setattr(scraper, "PoeScraper", FakeBrowser)
+    FAILING.add(("us", "gems"))
+    try:
+        results = scrape_locales(["tw", "us"], "selenium", max_workers=1, session=BrowserSession())
+    finally:
+        FAILING.clear()
+    assert results["tw"]["hashes"]["gems"] == "tw-gems"
+    assert "gems" not in results["us"]["hashes"]
+    assert results["us"]["gems"] == []
+    assert results["us"]["supports"] == ["us supports"]
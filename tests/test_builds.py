@@ -0,0 +1,58 @@
+# tests/test_builds.py
+# 完整流派產生器：輔助寶石的相容判斷與排除規則
+from builds import BuildIndex, generate_builds
+from database import PoeDatabase
+
+ACTIVES = [
+    {"name": "Fireball", "tags": "Spell, Projectile, Fire", "link": "a1"},
+    {"name": "Cleave", "tags": "Attack, Melee", "link": "a2"},
+]
+SUPPORTS = [
+    {"name": "Spell Echo", "tags": "Support, Spell", "link": "s1"},
+    {"name": "Faster Projectiles", "tags": "Support, Projectile", "link": "s2"},
+    {"name": "Melee Physical", "tags": "Support, Melee", "link": "s3"},
+    {"name": "Trigger One", "tags": "Support, Trigger, Spell", "link": "s4"},
+    {"name": "Trigger Two", "tags": "Support, Trigger", "link": "s5"},
+    {"name": "Added Fire", "tags": "Support, Fire", "link": "s6"},
+    {"name": "Generic", "tags": "Support", "link": "s7"},
+]
+
+def make_db(tmp_path):
+    db = PoeDatabase(str(tmp_path / "builds.db"))
+    db.bulk_save_ascendancies(["Juggernaut"])
+    db.bulk_save_gems(ACTIVES)
+    db.sync_data(None, None, support_list=SUPPORTS)
+    return db
+
+def test_support_only_tags_get_bits_but_do_not_change_compatibility():
+    index = BuildIndex(ACTIVES, SUPPORTS)
+    assert "Trigger" in index.tag_bits
+    assert index.mask(["Trigger"])
+    names = {s["name"]: j for j, s in enumerate(SUPPORTS)}
+    cleave = index.active_index["Cleave"]
+    # 只有 Trigger 標籤的輔助跟通用輔助一樣，跟任何技能都相容
+    assert index.is_compatible(cleave, names["Trigger Two"])
+    assert index.is_compatible(cleave, names["Generic"])
+    assert not index.is_compatible(cleave, names["Spell Echo"])
+
+def test_exclude_rule_on_support_only_tag_filters_supports(tmp_path):
+    db = make_db(tmp_path)
+    try:
+        builds = list(generate_builds(db, 200, include_tags=["Spell"], exclude_tags=["Trigger"],
+                                      support_count=3, seed=1))
+        assert builds
+        used = {s["name"] for build in builds for s in build["supports"]}
+        assert not any(name.startswith("Trigger") for name in used)
+
+        builds = list(generate_builds(db, 200, include_tags=["Spell"], support_count=3, seed=1))
+        used = {s["name"] for build in builds for s in build["supports"]}
+        assert {"Trigger One", "Trigger Two"} <= used
+    finally:
+        db.close()
+
+def test_get_gems_by_ids_skips_deleted_gems(tmp_path):
+    db = make_db(tmp_path)
+    ids = db.get_gem_pool()
+    # 抽樣之後、查名稱之前，背景同步刪掉了一個寶石
+    db.sync_data(None, [ACTIVES[1]])
+    assert [g["name"] for g in db.get_gems_by_ids(ids)] == ["Cleave"]
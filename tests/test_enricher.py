@@ -0,0 +1,62 @@
+# tests/test_enricher.py
+# 寶石詳細頁面的解析 (需求等級 / 魔力消耗 / 品質 / 顏色) 與抓取時的重試等待
+import enricher
+from conftest import FakeResponse, FakeSession, read_fixture
+from enricher import DetailFetcher, parse_gem_detail
+
+def test_parse_gem_detail_from_saved_page():
+    detail = parse_gem_detail(read_fixture("gem_detail_Tornado_Shot.html"))
+    assert detail["level"] == 28
+    assert detail["mana_cost"] == 8
+    assert detail["quality"] == (
+        "+0.5% increased Projectile Damage per 1% Quality\n"
+        "Divergent: +1% chance to fire an additional secondary Projectile"
+    )
+
+def test_colour_comes_from_gem_header_not_related_links():
+    # 頁面下方有紅色 / 藍色的相關寶石連結，但寶石本身是綠色
+    assert parse_gem_detail(read_fixture("gem_detail_Tornado_Shot.html"))["colour"] == "green"
+
+def test_level_table_headers_are_not_taken_as_required_level():
+    html = """
+    <h5 class="card-header gem_blue">火球</h5>
+    <table>
+      <tr><th>等級</th><th>需求等級</th><th>魔力消耗</th></tr>
+      <tr><td>20</td><td>70</td><td>25</td></tr>
+      <tr><th>需求等級</th><td>1</td></tr>
+      <tr><th>魔力消耗</th><td>6 魔力</td></tr>
+    </table>
+    """
+    detail = parse_gem_detail(html)
+    assert detail == {"level": 1, "colour": "blue", "mana_cost": 6, "quality": None}
+
+def test_missing_fields_are_none():
+    assert parse_gem_detail("<html><body><a class='gem_red'>x</a></body></html>") == {
+        "level": None, "colour": None, "mana_cost": None, "quality": None,
+    }
+
+def make_fetcher(monkeypatch, *responses, **kwargs):
+    sleeps = []
+    monkeypatch.setattr(enricher.time, "sleep", sleeps.append)
+    fetcher = DetailFetcher(**kwargs)
+    fetcher._local.session = FakeSession(*responses)
+    return fetcher, sleeps
+
+def test_retry_after_is_clamped_to_max_backoff(monkeypatch):
+    fetcher, sleeps = make_fetcher(monkeypatch, FakeResponse(429, headers={"Retry-After": "86400"}),
+                                   FakeResponse(200, "ok"), max_backoff=5)
+    assert fetcher.fetch("https://poedb.tw/us/Fireball") == "ok"
+    assert sleeps == [5]
+
+def test_short_retry_after_is_honoured(monkeypatch):
+    fetcher, sleeps = make_fetcher(monkeypatch, FakeResponse(503, headers={"Retry-After": "2"}),
+                                   FakeResponse(200, "ok"))
+    fetcher.fetch("https://poedb.tw/us/Fireball")
+    assert sleeps == [2]
+
+def test_http_date_retry_after_falls_back_to_backoff(monkeypatch):
+    fetcher, sleeps = make_fetcher(monkeypatch,
+                                   FakeResponse(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+                                   FakeResponse(200, "ok"), backoff=0.5)
+    fetcher.fetch("https://poedb.tw/us/Fireball")
+    assert len(sleeps) == 1 and 0.5 <= sleeps[0] <= 1.0
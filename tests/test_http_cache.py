@@ -0,0 +1,73 @@
+# tests/test_http_cache.py
+# HTTP 磁碟快取：條件式請求 (ETag / Last-Modified)、TTL、離線重播、舊內容檔清理
+import os
+
+import pytest
+
+from conftest import FakeResponse, FakeSession
+from http_cache import CacheMiss, HttpCache
+
+URL = "https://poedb.tw/us/Skill_Gems"
+
+def bodies(cache):
+    return sorted(os.listdir(os.path.join(cache.cache_dir, "bodies")))
+
+def test_etag_and_last_modified_revalidation(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    session = FakeSession(
+        FakeResponse(200, "<html>v1</html>", {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}),
+        FakeResponse(304),
+    )
+    html, body_hash = cache.fetch(session, URL, "us")
+    assert html == "<html>v1</html>"
+    assert session.calls[0][1] == {}
+
+    again = cache.fetch(session, URL, "us")
+    assert again == (html, body_hash)
+    assert session.calls[1][1] == {"If-None-Match": '"abc"',
+                                   "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+
+def test_ttl_skips_the_request(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=3600)
+    session = FakeSession(FakeResponse(200, "<html>v1</html>"))
+    first = cache.fetch(session, URL, "us")
+    assert cache.fetch(session, URL, "us") == first
+    assert len(session.calls) == 1
+
+def test_entries_are_per_language(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=3600)
+    session = FakeSession(FakeResponse(200, "<html>tw</html>"), FakeResponse(200, "<html>us</html>"))
+    assert cache.fetch(session, URL, "tw")[0] == "<html>tw</html>"
+    assert cache.fetch(session, URL, "us")[0] == "<html>us</html>"
+
+def test_offline_replays_cache_and_raises_on_miss(tmp_path):
+    HttpCache(str(tmp_path)).fetch(FakeSession(FakeResponse(200, "<html>v1</html>")), URL, "us")
+    offline = HttpCache(str(tmp_path), offline=True)
+    session = FakeSession()
+    assert offline.fetch(session, URL, "us")[0] == "<html>v1</html>"
+    with pytest.raises(CacheMiss):
+        offline.fetch(session, "https://poedb.tw/us/Support_Gems", "us")
+    assert session.calls == []
+
+def test_changed_content_removes_old_body(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    session = FakeSession(FakeResponse(200, "<html>v1</html>"), FakeResponse(200, "<html>v2</html>"))
+    cache.fetch(session, URL, "us")
+    _, new_hash = cache.fetch(session, URL, "us")
+    assert bodies(cache) == [f"{new_hash}.html.gz"]
+
+def test_shared_body_is_kept_while_referenced(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    session = FakeSession(FakeResponse(200, "same"), FakeResponse(200, "same"), FakeResponse(200, "new"))
+    _, shared = cache.fetch(session, URL, "us")
+    cache.fetch(session, URL, "tw")
+    _, new_hash = cache.fetch(session, URL, "us")
+    assert bodies(cache) == sorted([f"{shared}.html.gz", f"{new_hash}.html.gz"])
+
+def test_prune_removes_orphans_left_by_older_versions(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    _, body_hash = cache.fetch(FakeSession(FakeResponse(200, "<html>v1</html>")), URL, "us")
+    with open(os.path.join(cache.cache_dir, "bodies", "deadbeef.html.gz"), "wb") as f:
+        f.write(b"")
+    assert HttpCache(str(tmp_path)).prune() == 0  # 建立時已經清過
+    assert bodies(cache) == [f"{body_hash}.html.gz"]
@@ -0,0 +1,114 @@
+# tests/test_ingest.py
+# 串流寫入暫存區：斷點續寫、內容變了從頭來、沒寫完的頁面不同步，以及同步後的變更報告
+import pytest
+
+import init_data
+from database import PoeDatabase, locale_db_name
+from init_data import PageProgress, ingest_page, save_locale
+
+def gem_rows(count, fail_at=None, prefix="Gem"):
+    for i in range(count):
+        if i == fail_at:
+            raise RuntimeError("connection reset")
+        yield {"name": f"{prefix} {i}", "tags": "Spell, Fire", "link": f"/us/{prefix}_{i}"}
+
+def opener(rows, *hashes):
+    """open_rows()：依序回傳 hashes (開頁時 / 讀完時)"""
+    values = iter(hashes)
+    last = [None]
+
+    def page_hash():
+        last[0] = next(values, last[0])
+        return last[0]
+    return lambda: (rows, page_hash)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # 各語言資料庫檔建在目前目錄
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def open_db():
+    return PoeDatabase(locale_db_name("us"))
+
+def staged_names(page):
+    db = open_db()
+    try:
+        return [r[0] for r in db.cursor.execute(
+            "SELECT name FROM ingest_rows WHERE page = ? ORDER BY row_no", (page,))]
+    finally:
+        db.close()
+
+def test_resume_from_checkpoint_with_same_hash(workdir, capsys):
+    first = ingest_page("us", "gems", opener(gem_rows(10, fail_at=7), "h1"), batch_size=3)
+    assert first == PageProgress(7, False)
+    assert len(staged_names("gems")) == 7
+
+    second = ingest_page("us", "gems", opener(gem_rows(10), "h1"), batch_size=3)
+    assert second == PageProgress(10, True)
+    assert "resuming from row 7" in capsys.readouterr().out
+    assert staged_names("gems") == [f"Gem {i}" for i in range(10)]
+
+def test_restart_when_hash_differs(workdir, capsys):
+    ingest_page("us", "gems", opener(gem_rows(10, fail_at=7), "h1"), batch_size=3)
+    result = ingest_page("us", "gems", opener(gem_rows(4, prefix="New"), "h2"), batch_size=3)
+    assert result == PageProgress(4, True)
+    assert "resuming" not in capsys.readouterr().out
+    assert staged_names("gems") == [f"New {i}" for i in range(4)]
+
+def test_incomplete_page_is_not_synced(workdir):
+    progress = {
+        "ascendancies": ingest_page("us", "ascendancies", opener(iter(["Juggernaut"]), "a1")),
+        "gems": ingest_page("us", "gems", opener(gem_rows(10, fail_at=5), "g1"), batch_size=2),
+        "supports": None,
+    }
+    report = save_locale("us", progress)
+    assert report["incomplete"] == ["gems"]
+    assert report["ascendancies"]["inserted"] == ["Juggernaut"]
+    db = open_db()
+    try:
+        assert db.cursor.execute("SELECT COUNT(*) FROM skill_gems").fetchone()[0] == 0
+        # 暫存的列與斷點留著，下次接著寫
+        assert db.get_staged_pages() == {}
+        assert db.cursor.execute("SELECT next_row FROM ingest_checkpoints WHERE page = 'gems'").fetchone() == (5,)
+        assert db.get_page_hashes() == {"ascendancies": "a1"}
+    finally:
+        db.close()
+
+def test_synced_hash_is_taken_after_rows_are_read(workdir):
+    # http 後端被擋：開頁時是被擋頁面的雜湊，讀到一半改用 Selenium，讀完時換成 Selenium 的雜湊
+    ingest_page("us", "gems", opener(gem_rows(3), "blocked-http", "selenium"))
+    save_locale("us", {"ascendancies": None, "gems": PageProgress(3, True), "supports": None})
+    db = open_db()
+    try:
+        assert db.get_page_hashes() == {"gems": "selenium"}
+    finally:
+        db.close()
+
+def test_page_without_final_hash_clears_stored_hash(workdir):
+    ingest_page("us", "gems", opener(gem_rows(3), "h1"))
+    save_locale("us", {"ascendancies": None, "gems": PageProgress(3, True), "supports": None})
+    ingest_page("us", "gems", opener(gem_rows(4), "h2", None))
+    save_locale("us", {"ascendancies": None, "gems": PageProgress(4, True), "supports": None})
+    db = open_db()
+    try:
+        assert db.get_page_hashes() == {}
+    finally:
+        db.close()
+
+def test_open_failure_is_incomplete(workdir):
+    def open_rows():
+        raise RuntimeError("timeout")
+    assert ingest_page("us", "gems", open_rows) == PageProgress(0, False)
+    assert init_data.load_staged_pages(["us"]) == {"us": {}}
+
+def test_sync_report_lists_only_the_first_names(capsys):
+    report = {"gems": {"inserted": [f"Gem {i}" for i in range(25)], "updated": ["Cleave"], "deleted": []},
+              "incomplete": []}
+    init_data.print_sync_report(report, limit=20)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "[gems] inserted 25, updated 1, deleted 0"
+    assert "  inserted: Gem 19" in lines and "  inserted: Gem 20" not in lines
+    assert "  inserted: ... and 5 more" in lines
+    assert "  updated: Cleave" in lines
+    assert len(lines) == 1 + 20 + 1 + 1
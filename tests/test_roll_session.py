@@ -0,0 +1,73 @@
+# tests/test_roll_session.py
+# 不重複抽籤 session：一輪之內不重複、存檔讀回後接著抽、資料版本變了重新開始
+import os
+
+from database import PoeDatabase
+from roll_session import RollSession
+
+ASCENDANCIES = [f"Ascendancy {i}" for i in range(7)]
+GEMS = [{"name": f"Gem {i}", "tags": "Spell, Fire" if i % 2 else "Attack", "link": f"g{i}"} for i in range(10)]
+
+def make_db(tmp_path):
+    db = PoeDatabase(str(tmp_path / "session.db"))
+    db.bulk_save_ascendancies(ASCENDANCIES)
+    db.bulk_save_gems(GEMS)
+    return db
+
+def test_no_repeats_within_a_cycle(tmp_path):
+    db = make_db(tmp_path)
+    session = RollSession(seed=1)
+    drawn = [name for _ in range(7) for name in session.draw_ascendancies(db)]
+    assert sorted(drawn) == sorted(ASCENDANCIES)
+    # 下一輪又是完整的一輪
+    again = [name for _ in range(7) for name in session.draw_ascendancies(db)]
+    assert sorted(again) == sorted(ASCENDANCIES)
+
+def test_draw_across_cycle_boundary_has_no_duplicates(tmp_path):
+    db = make_db(tmp_path)
+    session = RollSession(seed=2)
+    session.draw_ascendancies(db, 5)
+    picked = session.draw_ascendancies(db, 4)
+    assert len(set(picked)) == 4
+    assert session.remaining("ascendancies||") == 7 - 2
+
+def test_each_filter_has_its_own_cycle(tmp_path):
+    db = make_db(tmp_path)
+    session = RollSession(seed=3)
+    fire = [g["name"] for _ in range(5) for g in session.draw_gems(db, ["Fire"])]
+    assert sorted(fire) == sorted(g["name"] for g in GEMS if "Fire" in g["tags"])
+    everything = [g["name"] for g in session.draw_gems(db, count=10)]
+    assert sorted(everything) == sorted(g["name"] for g in GEMS)
+
+def test_save_and_load_continue_the_same_sequence(tmp_path):
+    db = make_db(tmp_path)
+    path = str(tmp_path / "session.json")
+    reference = RollSession(seed=4)
+    expected = [g["name"] for g in reference.draw_gems(db, count=3) + reference.draw_gems(db, count=7)]
+
+    first = RollSession(path, seed=4)
+    drawn = [g["name"] for g in first.draw_gems(db, count=3)]
+    second = RollSession(path)
+    drawn += [g["name"] for g in second.draw_gems(db, count=7)]
+    assert drawn == expected
+    assert sorted(drawn) == sorted(g["name"] for g in GEMS)
+
+def test_without_autosave_only_flush_writes(tmp_path):
+    db = make_db(tmp_path)
+    path = str(tmp_path / "session.json")
+    session = RollSession(path, seed=5, autosave=False)
+    session.draw_ascendancies(db, 3)
+    assert not os.path.exists(path)
+    session.flush()
+    assert RollSession(path).remaining("ascendancies||") == 4
+    mtime = os.stat(path).st_mtime_ns
+    session.flush()  # 沒有新的變動就不寫
+    assert os.stat(path).st_mtime_ns == mtime
+
+def test_data_version_change_starts_over(tmp_path):
+    db = make_db(tmp_path)
+    session = RollSession(seed=6)
+    session.draw_ascendancies(db, 6)
+    db.bulk_save_ascendancies(["Ascendancy 7"])
+    drawn = session.draw_ascendancies(db, 8)
+    assert sorted(drawn) == sorted(ASCENDANCIES + ["Ascendancy 7"])
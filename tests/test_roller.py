@@ -0,0 +1,35 @@
+# tests/test_roller.py
+# 命令列抽籤：參數錯誤走 parser.error，沒有符合的流派時回傳非 0
+import pytest
+
+import roller
+from database import PoeDatabase
+
+def make_db(tmp_path):
+    path = str(tmp_path / "roller.db")
+    db = PoeDatabase(path)
+    db.bulk_save_ascendancies(["Juggernaut"])
+    db.bulk_save_gems([{"name": "Fireball", "tags": "Spell, Fire", "link": "a1"}])
+    db.sync_data(None, None, support_list=[{"name": "Spell Echo", "tags": "Support, Spell", "link": "s1"}])
+    db.close()
+    return path
+
+@pytest.mark.parametrize("args, message", [
+    (["--tag-weight", "Fire=abc"], "--tag-weight expects a number"),
+    (["--weights", "missing.csv"], "--weights: cannot read"),
+])
+def test_bad_arguments_exit_with_usage_error(tmp_path, capsys, args, message):
+    with pytest.raises(SystemExit) as exc:
+        roller.main(["--db", make_db(tmp_path)] + args)
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
+
+def test_builds_without_match_return_non_zero(tmp_path, capsys):
+    assert roller.main(["--db", make_db(tmp_path), "--builds", "--include", "Minion"]) == 1
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert "No build matches" in err
+
+def test_builds_with_match_succeed(tmp_path, capsys):
+    assert not roller.main(["--db", make_db(tmp_path), "--builds", "--supports", "1", "-n", "2"])
+    assert capsys.readouterr().out.count('"skill"') == 2
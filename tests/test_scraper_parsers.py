@@ -0,0 +1,41 @@
+# tests/test_scraper_parsers.py
+# 用存下來的 poedb 頁面檢查 http 後端的解析器 (selector 改版時這裡會先壞)
+from conftest import read_fixture
+from scraper import iter_gem_rows, parse_active_gems, parse_ascendancies
+
+BASE_URL = "https://poedb.tw/us/Skill_Gems"
+
+def test_parse_ascendancies_names_in_order_without_duplicates():
+    names = parse_ascendancies(read_fixture("Ascendancy_class.html"))
+    assert names == ["Juggernaut", "Berserker", "Chieftain", "Ascendant"]
+
+def test_parse_active_gems_names_links_and_tags():
+    gems = parse_active_gems(read_fixture("Skill_Gems.html"), BASE_URL)
+    assert [g["name"] for g in gems] == ["Fireball", "Cleave", "Contagion", "Tornado Shot"]
+    by_name = {g["name"]: g for g in gems}
+    assert by_name["Fireball"] == {
+        "name": "Fireball",
+        "tags": "Spell, Projectile, Fire, AoE",
+        "link": "https://poedb.tw/us/Fireball",
+    }
+    # 換行與多餘空白會被合併 (跟 Selenium 的 .text 一樣)
+    assert by_name["Cleave"]["tags"] == "Attack, AoE, Melee"
+    assert by_name["Cleave"]["link"] == "https://poedb.tw/us/Cleave"
+    # 絕對網址保持不變
+    assert by_name["Tornado Shot"]["link"] == "https://poedb.tw/us/Tornado_Shot"
+
+def test_row_without_gem_tags_falls_back_to_data_tags():
+    gems = {g["name"]: g for g in parse_active_gems(read_fixture("Skill_Gems.html"), BASE_URL)}
+    assert gems["Contagion"]["tags"] == "Spell, Chaos, Duration"
+
+def test_rows_without_name_link_are_skipped():
+    gems = parse_active_gems(read_fixture("Skill_Gems.html"), BASE_URL)
+    assert not any("Vaal" in (g["tags"] or "") for g in gems)
+    assert len(gems) == 4
+
+def test_iter_gem_rows_is_lazy_and_matches_list_version():
+    html = read_fixture("Skill_Gems.html")
+    rows = iter_gem_rows(html, BASE_URL)
+    assert next(rows)["name"] == "Fireball"
+    assert [next(rows)["name"] for _ in range(3)] == ["Cleave", "Contagion", "Tornado Shot"]
+    assert list(iter_gem_rows(html, BASE_URL)) == parse_active_gems(html, BASE_URL)
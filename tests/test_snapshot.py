@@ -0,0 +1,85 @@
+# tests/test_snapshot.py
+# 資料快照：匯出 / 匯入來回一致，壞掉的快照整份拒絕且不動到原本的資料
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+from database import PoeDatabase
+from snapshot import SnapshotError, export_snapshot, import_snapshot, seed_database
+
+GEMS = [
+    {"name": "Fireball", "tags": "Spell, Projectile, Fire", "link": "/us/Fireball"},
+    {"name": "Cleave", "tags": "Attack, Melee", "link": "/us/Cleave"},
+]
+SUPPORTS = [{"name": "Spell Echo", "tags": "Support, Spell", "link": "/us/Spell_Echo"}]
+
+def make_db(path):
+    db = PoeDatabase(str(path))
+    db.bulk_save_ascendancies(["Juggernaut", "Berserker"])
+    db.bulk_save_gems(GEMS)
+    db.sync_data(None, None, support_list=SUPPORTS)
+    gem_id = db.cursor.execute("SELECT id FROM skill_gems WHERE name = 'Fireball'").fetchone()[0]
+    db.save_gem_details([(gem_id, {"level": 1, "colour": "blue", "mana_cost": 6, "quality": "+1% cast speed"})])
+    return db
+
+def write_snapshot(path, **overrides):
+    data = {"format": 1, "lang": "us", "created": "", "data_version": 1,
+            "ascendancies": ["Juggernaut"], "gems": [["Fireball", "Spell", "/us/Fireball"]],
+            "supports": [], "details": []}
+    data.update(overrides)
+    with gzip.open(path, "wb") as f:
+        f.write(json.dumps(data).encode("utf-8"))
+
+def test_round_trip(tmp_path):
+    src = make_db(tmp_path / "src.db")
+    export_snapshot(src, str(tmp_path / "snap.json.gz"), "us")
+    dst = PoeDatabase(str(tmp_path / "dst.db"))
+    counts = import_snapshot(dst, str(tmp_path / "snap.json.gz"))
+    assert counts == {"ascendancies": 2, "gems": 2, "supports": 1, "details": 1}
+    assert [g["name"] for g in dst.get_support_gems()] == ["Spell Echo"]
+    assert dst.get_gem_details("Fireball")["colour"] == "blue"
+    assert dst.cursor.execute("SELECT COUNT(*) FROM gem_tags").fetchone()[0] == 5
+
+@pytest.mark.parametrize("overrides", [
+    {"gems": [["Fireball", "Spell"]]},
+    {"supports": [["Spell Echo", "Support", "/us/Spell_Echo", "extra"]]},
+    {"details": [["Fireball", 1, "blue"]]},
+    {"ascendancies": [["Juggernaut"]]},
+    {"gems": [[None, "Spell", "/us/Fireball"]]},
+    {"gems": {"Fireball": "Spell"}},
+])
+def test_malformed_rows_raise_snapshot_error(tmp_path, overrides):
+    path = str(tmp_path / "bad.json.gz")
+    write_snapshot(path, **overrides)
+    db = make_db(tmp_path / "db.db")
+    version = db.get_data_version()
+    with pytest.raises(SnapshotError):
+        import_snapshot(db, path)
+    # 原本的資料跟版本號都不動
+    assert db.get_data_version() == version
+    assert db.cursor.execute("SELECT COUNT(*) FROM skill_gems").fetchone()[0] == 2
+
+def test_failed_write_rolls_back_everything(tmp_path, monkeypatch):
+    path = str(tmp_path / "snap.json.gz")
+    write_snapshot(path, details=[["Fireball", 1, "blue", 6, "q"]])
+    db = make_db(tmp_path / "db.db")
+    version = db.get_data_version()
+
+    def fail(details):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(db, "_write_gem_details", fail)
+    with pytest.raises(SnapshotError):
+        import_snapshot(db, path)
+    assert db.get_data_version() == version
+    assert db.cursor.execute("SELECT COUNT(*) FROM ascendancies").fetchone()[0] == 2
+    assert db.get_gem_details("Fireball")["colour"] == "blue"
+
+def test_seed_database_skips_malformed_snapshot(tmp_path, capsys):
+    path = str(tmp_path / "bad.json.gz")
+    write_snapshot(path, gems=[["Fireball"]])
+    db = PoeDatabase(str(tmp_path / "empty.db"))
+    assert seed_database(db, "us", path) is False
+    assert "malformed gems row 0" in capsys.readouterr().out
+    assert db.cursor.execute("SELECT COUNT(*) FROM skill_gems").fetchone()[0] == 0